@@ -1,156 +1,257 @@
-import re
+import os
 import asyncio
+import contextlib
 import time
+from api.metrics import collect_timings, span, summarize_timings
 from api.utils.semantic_analysis import analyze_query
-from api.scrapers.async_reddit import fetch_from_reddit
-from api.scrapers.async_news import fetch_from_newsapi
-from api.scrapers.async_hn import fetch_from_hackernews
-from api.scrapers.async_ddg import fetch_from_duckduckgo
-from api.utils.embeddings import embed_texts
-from api.utils.clustering import cluster_embeddings
-from api.utils.labeling import generate_summary
-from api.graph_builder import build_graph_response
-
-async def run_async_pipeline(query, sources=None):
+from api.scrapers.cache import cached_fetch
+from api.scrapers.registry import get_fetcher, registered_sources, resolve_sources
+from api.processing import process_global, process_sub_queries, resolve_cluster_scope
+from api.workers import run_cpu
+from api.graph_builder import ROOT_ID, EvidenceTable, build_graph_response, build_root_nodes, build_cluster_nodes
+
+# Wall-clock budget for the whole fetch fan-out; whatever hasn't arrived by
+# then is cancelled and the pipeline goes ahead with partial results.
+FETCH_BUDGET = float(os.getenv("THOUGHTNET_FETCH_BUDGET", "8.0"))
+
+
+async def fetch_wrapper(sq, spec):
+    print(f"  -> Starting fetch for '{sq}' from {spec.label}")
+    with span("fetch", source=spec.name) as s:
+        # Limit 10 per source per sub-query; served from the TTL cache when warm,
+        # and never waiting past the source's own deadline once the request is
+        # out (time queued in the scheduler doesn't count)
+        try:
+            res = await cached_fetch(spec.name, get_fetcher(spec), sq, limit=10, ttl=spec.ttl,
+                                     deadline=spec.deadline)
+        except asyncio.CancelledError:
+            s.set(outcome="budget")
+            raise
+        except Exception as e:
+            s.set(outcome=fetch_failure_reason(e))
+            raise
+        s.set(outcome="ok", items=len(res))
+    print(f"  <- Finished fetch for '{sq}' from {spec.label}")
+    return sq, res
+
+
+def dropped_fetch(sq, src_key, reason):
+    return {"source": src_key, "sub_query": sq, "reason": reason}
+
+
+def fetch_failure_reason(exc):
+    # cached_fetch raises TimeoutError when a source misses its own deadline
+    return "deadline" if isinstance(exc, asyncio.TimeoutError) else "error"
+
+
+async def gather_fetches(fetches, budget=None):
+    """
+    Runs `fetches` ((sq, source, coroutine) tuples) concurrently for at most
+    `budget` seconds. Returns `(results, dropped)`: the (sq, items) pairs
+    that arrived, and one {"source", "sub_query", "reason"} entry for every
+    fetch that missed its deadline, the global budget, or failed.
+    """
+    budget = FETCH_BUDGET if budget is None else budget
+    tasks = {asyncio.ensure_future(coro): (sq, src_key) for sq, src_key, coro in fetches}
+    if not tasks:
+        return [], []
+
+    done, pending = await asyncio.wait(tasks, timeout=budget)
+
+    results, dropped = [], []
+    for task, (sq, src_key) in tasks.items():
+        if task in pending:
+            # Laggards are cancelled (a DDG search thread just finishes unobserved)
+            task.cancel()
+            dropped.append(dropped_fetch(sq, src_key, "budget"))
+        elif task.exception() is not None:
+            print(f"[AsyncPipeline] Task failed with error: {task.exception()!r}")
+            dropped.append(dropped_fetch(sq, src_key, fetch_failure_reason(task.exception())))
+        else:
+            results.append(task.result())
+    return results, dropped
+
+
+def build_fetch_tasks(sub_queries, sources):
+    """
+    One fetch per (sub-query, source), as (sq, source_key, coroutine) tuples.
+    Each coroutine resolves to (sq, items).
+    Sources come from api.scrapers.registry; live fetchers go through the
+    per-source scheduler (concurrency caps, rate limits, Retry-After
+    backoff), so many sub-queries don't trigger 429s.
+    """
+    specs = resolve_sources(sources)
+    return [(sq, spec.name, fetch_wrapper(sq, spec)) for sq in sub_queries for spec in specs]
+
+
+async def run_async_pipeline(query, sources=None, labeler=None, timings=False, cluster_scope=None):
+    """
+    With `timings=True` the graph carries a "timings" list with every
+    stage span of this run (see api.metrics); the histograms at
+    /api/metrics/ are updated either way.
+    `cluster_scope="global"` clusters all sub-queries' results together
+    (clusters shared between sub-queries, see process_global).
+    """
+    cluster_scope = resolve_cluster_scope(cluster_scope)
+    if not timings:
+        return await _run_async_pipeline(query, sources, labeler, cluster_scope)
+
+    with collect_timings() as spans:
+        graph_data = await _run_async_pipeline(query, sources, labeler, cluster_scope)
+    graph_data["timings"] = summarize_timings(spans)
+    return graph_data
+
+
+async def _run_async_pipeline(query, sources, labeler, cluster_scope):
     if sources is None:
-        sources = ["reddit", "news", "hn", "ddg"]
-    
-    start_total = time.time()
-    
-    # 1. Semantic Analysis (Sync but fast)
-    sub_queries, complexity = analyze_query(query)
-    print(f"[AsyncPipeline] Sub-queries: {sub_queries}")
-    
-    # 2. Parallel Data Fetching
-    # We want to fetch data for ALL sub-queries from ALL sources in parallel.
-    tasks = []
-    
-    # Structure to hold results: { "sub_query": [results] }
-    # We'll use a wrapper to keep track of which sub-query a result belongs to.
-    
-    async def fetch_wrapper(sq, src_func, src_name):
-        print(f"  -> Starting fetch for '{sq}' from {src_name}")
-        t0 = time.time()
-        res = await src_func(sq, limit=10) # Limit 10 per source per sub-query
-        print(f"  <- Finished fetch for '{sq}' from {src_name} in {time.time()-t0:.2f}s")
-        return sq, res
-
-    for sq in sub_queries:
-        if "reddit" in sources:
-            tasks.append(fetch_wrapper(sq, fetch_from_reddit, "Reddit"))
-        if "news" in sources:
-            # NewsAPI might limit QPS, so we might need a semaphore if many sub-queries
-            tasks.append(fetch_wrapper(sq, fetch_from_newsapi, "NewsAPI"))
-        if "hn" in sources:
-            tasks.append(fetch_wrapper(sq, fetch_from_hackernews, "HN"))
-        if "ddg" in sources or "web" in sources:
-            tasks.append(fetch_wrapper(sq, fetch_from_duckduckgo, "DuckDuckGo"))
-            
-    # Execute all fetches
-    params_fetch_start = time.time()
-    results_flat = await asyncio.gather(*tasks, return_exceptions=True)
-    print(f"[AsyncPipeline] Total Fetch Time: {time.time() - params_fetch_start:.2f}s")
-    
-    # Aggregation
-    sq_data = {sq: [] for sq in sub_queries}
-    for res in results_flat:
-        if isinstance(res, Exception):
-            print(f"[AsyncPipeline] Task failed with error: {res}")
-            continue
-        # res is (sq_key, items)
-        sq_key, items = res
-        
-        # Relevance Filter: Filter out noise (e.g. random Chinese results or unrelated topics)
-        # Simple heuristic: Item must contain at least one meaningful word from the sub-query?
-        # Or just rely on clustering? 
-        # The user saw "Rap" and "WeChat" for "Quantum Computing". That's unacceptable.
-        
-        filtered_items = []
-        sq_words = set(re.findall(r'\w+', sq_key.lower()))
-        # Remove stop words roughly
-        stop_words = {"where", "are", "we", "in", "the", "of", "it", "is", "to", "or", "and", "a", "an", "for"}
-        keywords = {w for w in sq_words if w not in stop_words and len(w) > 2}
-        
-        for item in items:
-            content = (item.get('content') or "").lower()
-            title = (item.get('title') or "").lower() # some items might have label/title
-            text_to_check = content + " " + title
-            
-            # If we represent "Quantum Computing", and result has NONE of the keywords, drop it.
-            # But if query is "Is it too far?", keywords might be "too", "far".
-            # Be careful with strictness.
-            if not keywords: 
-                filtered_items.append(item) # Cannot filter if no keywords
-                continue
-                
-            if any(k in text_to_check for k in keywords):
-                filtered_items.append(item)
-            else:
-                # print(f"Filtered out irrelevant: {item.get('url')}")
-                pass
-                
-        sq_data[sq_key].extend(filtered_items)
-        
-    # 3. Process Each Sub-Query (Embed -> Cluster -> Label)
-    # This part is CPU bound (Embeddings), so we run it synchronously or in a thread pool executor.
-    # For now, we'll keep it simple sequentially per sub-query or parallelize if needed, 
-    # but embedding models often release GIL or use C++ backends so it might be okay.
-    
-    final_clusters = {} # { "sub_query": { "cluster_label": [items] } }
-    
-    for sq, items in sq_data.items():
-        if not items:
-            continue
-            
-        # Extract text for embedding
-        texts = [item['content'] for item in items]
-        
-        # Deduplicate based on content
-        unique_items = []
-        seen_texts = set()
-        for it in items:
-            if it['content'] not in seen_texts:
-                unique_items.append(it)
-                seen_texts.add(it['content'])
-        
-        items = unique_items
-        texts = [item['content'] for item in items]
-        
-        if not texts:
-            continue
-
-        print(f"  Processing {len(texts)} items for '{sq}'...")
-        embeddings = embed_texts(texts)
-        
-        # Determine N clusters based on volume
-        # If texts < 2, we can't do KMeans with n=2. Just put all in one cluster.
-        if len(texts) < 2:
-            labels = [0] * len(texts)
+        sources = [spec.name for spec in registered_sources()]
+
+    with span("total", mode="batch"):
+        # 1. Semantic Analysis (Sync but fast)
+        with span("analyze"):
+            sub_queries, complexity = analyze_query(query)
+        print(f"[AsyncPipeline] Sub-queries: {sub_queries}")
+
+        # 2. Parallel Data Fetching
+        # We want to fetch data for ALL sub-queries from ALL sources in parallel,
+        # but never wait longer than the fetch budget for the slowest source.
+        with span("fetch_all"):
+            results, dropped = await gather_fetches(build_fetch_tasks(sub_queries, sources))
+        if dropped:
+            print(f"[AsyncPipeline] Dropped {len(dropped)} fetches: {dropped}")
+
+        # Aggregation
+        # Structure to hold results: { "sub_query": [results] }
+        sq_data = {sq: [] for sq in sub_queries}
+        for sq_key, items in results:
+            sq_data[sq_key].extend(items)
+
+        # 3. Process Each Sub-Query (Embed -> Filter -> Cluster -> Label)
+        # This part is CPU bound, so it runs in the worker pool instead of on the
+        # event loop; other requests' fetches keep going while we embed.
+        if cluster_scope == "global":
+            shared_clusters = await run_cpu(process_global, sq_data, labeler=labeler)
+            final_clusters = {}
         else:
-            n_clusters = max(2, min(len(texts) // 3, 5))
-            # Safety check: n_clusters must be < len(texts) if we want valid clusters, 
-            # actually KMeans works if n_clusters <= len(texts), but if equal, every point is a cluster.
-            if n_clusters > len(texts):
-                 n_clusters = len(texts)
-                 
-            labels, _ = cluster_embeddings(embeddings, method="kmeans", n_clusters=n_clusters)
-        
-        # Group by label
-        groups = {}
-        for lab, item in zip(labels, items):
-            groups.setdefault(lab, []).append(item)
-            
-        # Generate Summaries for labels
-        named_groups = {}
-        for lab, group_items in groups.items():
-            cluster_texts = [x['content'] for x in group_items]
-            summary_label = generate_summary(cluster_texts) # Uses BART (might be slow)
-            named_groups[summary_label] = group_items
-            
-        final_clusters[sq] = named_groups
-        
-    # 4. Build Graph
-    graph_data = build_graph_response(query, sq_data, final_clusters)
-    
-    print(f"[AsyncPipeline] Total Execution: {time.time() - start_total:.2f}s")
+            shared_clusters = None
+            final_clusters = await run_cpu(process_sub_queries, sq_data, labeler=labeler)
+
+        # 4. Build Graph
+        with span("graph_build"):
+            graph_data = build_graph_response(query, sq_data, final_clusters, shared_clusters=shared_clusters)
+        graph_data["dropped_sources"] = dropped
+
     return graph_data
+
+
+async def stream_async_pipeline(query, sources=None, labeler=None):
+    """
+    Incremental version of run_async_pipeline.
+
+    Yields graph fragments as they become ready instead of one graph at the end:
+      {"event": "init", "root_id", "sub_queries", "nodes", "edges"}   - root + sub-query nodes
+      {"event": "clusters", "sub_query", "nodes", "edges"}           - one per finished sub-query
+      {"event": "error", "sub_query", "error"}                       - a sub-query failed
+      {"event": "done", "dropped_sources"}
+    A sub-query is embedded/clustered/labelled as soon as all of its own
+    fetches are in, so fast sub-queries don't wait for the slowest one.
+    That's why streaming always clusters per sub-query; global clustering
+    would have to wait for every fetch.
+    """
+    if sources is None:
+        sources = [spec.name for spec in registered_sources()]
+
+    # aclosing: a client disconnect has to reach the inner generator's
+    # cleanup (cancelling fetches) right away, not at garbage collection
+    with span("total", mode="stream"):
+        async with contextlib.aclosing(_stream_async_pipeline(query, sources, labeler)) as events:
+            async for event in events:
+                yield event
+
+
+async def _stream_async_pipeline(query, sources, labeler):
+    with span("analyze"):
+        sub_queries, complexity = analyze_query(query)
+    print(f"[AsyncStream] Sub-queries: {sub_queries}")
+
+    nodes, edges = build_root_nodes(query, sub_queries)
+    # One evidence table for the whole stream; each "clusters" event carries
+    # the rows it added, starting at "evidence_offset"
+    evidence = EvidenceTable()
+    yield {
+        "event": "init",
+        "root_id": ROOT_ID,
+        "sub_queries": sub_queries,
+        "nodes": nodes,
+        "edges": edges,
+    }
+
+    def process(sq):
+        return asyncio.ensure_future(run_cpu(process_sub_queries, {sq: sq_data[sq]}, labeler=labeler))
+
+    sq_data = {sq: [] for sq in sub_queries}
+    pending_fetches = {sq: 0 for sq in sub_queries}
+    fetch_tasks = {} # task -> (sub-query, source)
+    for sq, src_key, coro in build_fetch_tasks(sub_queries, sources):
+        fetch_tasks[asyncio.ensure_future(coro)] = (sq, src_key)
+        pending_fetches[sq] += 1
+    dropped = []
+    fetch_deadline = time.time() + FETCH_BUDGET
+
+    # Sub-queries with nothing to fetch are done already
+    process_tasks = {process(sq): sq for sq, count in pending_fetches.items() if count == 0}
+
+    try:
+        pending = set(fetch_tasks) | set(process_tasks)
+        while pending:
+            fetching = [t for t in pending if t in fetch_tasks]
+            timeout = max(0.0, fetch_deadline - time.time()) if fetching else None
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done and fetching:
+                # Fetch budget spent: cancel the laggards, go on with what we have
+                for task in fetching:
+                    task.cancel()
+                # Let them settle as cancelled so they're handled like any other fetch
+                await asyncio.wait(fetching)
+                done = set(fetching)
+                pending -= done
+
+            for task in done:
+                if task in fetch_tasks:
+                    sq, src_key = fetch_tasks[task]
+                    if task.cancelled():
+                        dropped.append(dropped_fetch(sq, src_key, "budget"))
+                    elif task.exception() is not None:
+                        print(f"[AsyncStream] Task failed with error: {task.exception()!r}")
+                        dropped.append(dropped_fetch(sq, src_key, fetch_failure_reason(task.exception())))
+                    else:
+                        sq_key, items = task.result()
+                        sq_data[sq_key].extend(items)
+
+                    pending_fetches[sq] -= 1
+                    if pending_fetches[sq] == 0:
+                        proc = process(sq)
+                        process_tasks[proc] = sq
+                        pending.add(proc)
+                    continue
+
+                sq = process_tasks[task]
+                if task.exception() is not None:
+                    print(f"[AsyncStream] Processing '{sq}' failed: {task.exception()}")
+                    yield {"event": "error", "sub_query": sq, "error": str(task.exception())}
+                    continue
+
+                with span("graph_build"):
+                    nodes, edges = build_cluster_nodes(query, sq, task.result().get(sq, {}), evidence)
+                    offset, new_evidence = evidence.take_new()
+                print(f"[AsyncStream] '{sq}' ready")
+                yield {"event": "clusters", "sub_query": sq, "nodes": nodes, "edges": edges,
+                       "evidence_offset": offset, "evidence": new_evidence}
+    finally:
+        # Client went away (or something failed): don't leave fetches running
+        for task in list(fetch_tasks) + list(process_tasks):
+            if not task.done():
+                task.cancel()
+
+    yield {"event": "done", "dropped_sources": dropped}
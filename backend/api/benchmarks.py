@@ -0,0 +1,315 @@
+"""
+Reproducible benchmarks for the ThoughtNet pipeline stages.
+
+Run through the management command:
+
+    python manage.py benchmark_pipeline --sizes 50,200,1000 --repeats 5
+
+Every stage is timed `repeats` times per corpus size after one warmup run
+and reported as p50 / p95 latency, throughput (items per second at p50)
+and peak RSS while the stage ran. Fetches are served from recorded
+fixtures (see api.scrapers.replay), so no network is involved; the corpus
+for the CPU stages is built from those fixtures and padded with seeded
+synthetic sentences, so the same arguments always benchmark the same data.
+"""
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+SAMPLE_QUERIES = [
+    "Is AGI upcoming or false?",
+    "Where are we in quantum computing and is it too far?",
+    "What do people think about remote work and how does it affect productivity?",
+    "Electric cars: are they really greener, and what about battery recycling?",
+]
+
+CLUSTER_METHODS = ["kmeans", "kmeans-auto", "hdbscan", "agglomerative", "dbscan", "spectral", "meanshift",
+                   "minibatch_kmeans", "hdbscan_approx", "agglomerative_knn", "spectral_knn", "meanshift_sampled"]
+
+_VOCAB = (
+    "ai model data quantum computer qubit research startup market energy battery "
+    "car policy climate remote work office team productivity chip gpu training "
+    "open source license privacy security browser regulation funding hardware "
+    "software language reasoning benchmark network cloud storage robot vision"
+).split()
+
+
+def _rss_bytes():
+    # Current resident set size; /proc is Linux-only, fall back to peak RSS
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PeakRSS:
+    """
+    Samples RSS on a background thread while the block runs.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+def measure(stage, func, n_items, repeats=5, setup=None, **labels):
+    """
+    Times `func()` `repeats` times (after one untimed warmup) and returns a
+    result row. `setup()`, if given, runs untimed before every call, e.g.
+    to clear caches.
+    """
+    if setup:
+        setup()
+    func()  # warmup: lazy model loads, allocator, caches of other layers
+
+    timings = []
+    with PeakRSS() as rss:
+        for _ in range(repeats):
+            if setup:
+                setup()
+            t0 = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - t0)
+
+    p50 = float(np.percentile(timings, 50))
+    return {
+        "stage": stage,
+        **labels,
+        "n": n_items,
+        "p50_ms": p50 * 1000,
+        "p95_ms": float(np.percentile(timings, 95)) * 1000,
+        "throughput": n_items / p50 if p50 > 0 else None,
+        "peak_rss_mb": rss.peak / 2**20,
+    }
+
+
+def build_corpus(size, fixture_items=(), seed=42):
+    """
+    `size` result items: recorded fixture items first, then seeded
+    synthetic sentences, so runs are comparable across machines.
+    """
+    items = [dict(it) for it in fixture_items[:size]]
+    rng = random.Random(seed)
+    sources = ["Reddit", "HackerNews", "NewsAPI", "Web Search (DDG)"]
+    while len(items) < size:
+        words = rng.choices(_VOCAB, k=rng.randint(6, 16))
+        i = len(items)
+        items.append({
+            "content": " ".join(words).capitalize() + f" ({i}).",
+            "source": sources[i % len(sources)],
+            "url": f"https://example.com/{i}",
+            "meta": {},
+        })
+    return items
+
+
+def load_fixture_items(fixture_dir=None):
+    from api.scrapers import replay
+    import json
+    from pathlib import Path
+
+    root = Path(fixture_dir) if fixture_dir else replay.FIXTURE_DIR
+    items = []
+    for path in sorted(root.glob("*/*.json")):
+        items.extend(json.loads(path.read_text())["results"])
+    return items
+
+
+def bench_analyze(repeats):
+    from api.utils.semantic_analysis import analyze_query
+
+    def run():
+        for q in SAMPLE_QUERIES:
+            analyze_query(q)
+
+    setup = getattr(analyze_query, "cache_clear", None)
+    return [measure("analyze_query", run, len(SAMPLE_QUERIES), repeats, setup=setup)]
+
+
+def bench_fetch(repeats, sources, fixture_dir=None):
+    from api.async_pipeline import build_fetch_tasks, gather_fetches
+    from api.scrapers import cache
+    from api.scrapers.registry import set_scraper_mode
+    from api.utils.semantic_analysis import analyze_query
+
+    set_scraper_mode("replay", fixture_dir)
+    sub_queries = [sq for q in SAMPLE_QUERIES for sq in analyze_query(q)[0]]
+
+    def run():
+        async def go():
+            results, _ = await gather_fetches(build_fetch_tasks(sub_queries, sources))
+            return results
+        asyncio.run(go())
+
+    return [measure("fetch (replay)", run, len(sub_queries) * len(sources), repeats,
+                    setup=cache._local.clear)]
+
+
+def bench_cpu_stages(size, repeats, corpus, labelers=("extractive",), methods=CLUSTER_METHODS):
+    from api.graph_builder import build_graph_response
+    from api.utils import embeddings as emb_module
+    from api.utils import labeling
+    from api.utils.clustering import cluster_embeddings
+
+    texts = [it["content"] for it in corpus]
+    rows = []
+
+    # Cold: every text goes through the model
+    rows.append(measure("embed_texts", lambda: emb_module.embed_texts(texts, use_cache=False), size, repeats))
+    if emb_module.get_store() is not None:
+        rows.append(measure("embed_texts (cached)", lambda: emb_module.embed_texts(texts), size, repeats))
+
+    embeddings = emb_module.embed_texts(texts)
+    n_clusters = max(2, min(size // 3, 5))
+
+    for method in methods:
+        k_methods = ("kmeans", "minibatch_kmeans", "agglomerative", "agglomerative_knn", "spectral", "spectral_knn")
+        kwargs = {"n_clusters": n_clusters} if method in k_methods else {}
+        algo = method
+        if method == "kmeans-auto":
+            algo, kwargs = "kmeans", {"n_clusters": "auto"}
+        try:
+            rows.append(measure("cluster_embeddings", lambda: cluster_embeddings(embeddings, method=algo, **kwargs),
+                                size, repeats, method=method))
+        except Exception as e:
+            print(f"[Benchmark] {method} failed at n={size}: {e}")
+
+    labels, _ = cluster_embeddings(embeddings, method="kmeans", n_clusters=n_clusters)
+    groups = [np.flatnonzero(labels == lab) for lab in np.unique(labels)]
+    text_groups = [[texts[i] for i in g] for g in groups]
+    emb_groups = [embeddings[g] for g in groups]
+
+    for mode in labelers:
+        rows.append(measure(
+            "generate_summary",
+            lambda: labeling.generate_summaries(text_groups, mode=mode, embedding_groups=emb_groups),
+            len(text_groups), repeats, setup=labeling._summary_cache.clear, labeler=mode,
+        ))
+
+    clusters = {"benchmark": {f"cluster {i}": [corpus[j] for j in g] for i, g in enumerate(groups)}}
+    rows.append(measure("build_graph_response",
+                        lambda: build_graph_response("benchmark", {"benchmark": corpus}, clusters),
+                        size, repeats))
+    return rows
+
+
+# Minimum cosine similarity between a backend's vectors and the fp32 torch
+# reference for the same sentence
+PARITY_TOLERANCE = float(os.getenv("THOUGHTNET_EMBED_PARITY_TOLERANCE", "0.98"))
+
+
+def embedding_parity(backend, texts, reference="torch"):
+    """
+    Row-wise cosine similarity between `backend` and `reference` vectors of
+    the same texts. Returns {"min_cos", "mean_cos", "ok"}.
+    """
+    from api.utils.embeddings import embed_texts
+
+    ref = embed_texts(texts, use_cache=False, backend=reference)
+    got = embed_texts(texts, use_cache=False, backend=backend)
+    # Both sides are unit length
+    cos = np.einsum("ij,ij->i", ref, got)
+    return {
+        "min_cos": float(cos.min()),
+        "mean_cos": float(cos.mean()),
+        "ok": bool(cos.min() >= PARITY_TOLERANCE),
+    }
+
+
+def bench_embedding_backends(backends, corpus, repeats):
+    """
+    Sentences/sec, peak RSS and the RSS the model itself added, per
+    embedding backend, plus parity against fp32 torch. The model memory
+    is only meaningful for backends loaded for the first time here, so the
+    lightest backends should be listed first.
+    """
+    from api.utils import embeddings as emb_module
+
+    texts = [it["content"] for it in corpus]
+    rows = []
+    for backend in backends:
+        before = _rss_bytes()
+        loaded = emb_module.loaded_backend(backend)
+        model_mb = (_rss_bytes() - before) / 2**20
+        if loaded != backend:
+            print(f"[Benchmark] {backend} not available, skipped")
+            continue
+
+        row = measure("embed_backend", lambda: emb_module.embed_texts(texts, use_cache=False, backend=backend),
+                      len(texts), repeats, backend=backend)
+        row["model_mb"] = model_mb
+        row.update(embedding_parity(backend, texts))
+        rows.append(row)
+    return rows
+
+
+def format_backends(rows):
+    width = max([len("backend")] + [len(r["backend"]) for r in rows]) + 2
+    header = f"{'backend':<{width}}{'sent/s':>10}{'peak MB':>10}{'model MB':>10}{'min cos':>10}{'mean cos':>10}"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        flag = "" if r["ok"] else f"  < {PARITY_TOLERANCE}"
+        lines.append(f"{r['backend']:<{width}}{r['throughput']:>10.1f}{r['peak_rss_mb']:>10.1f}{r['model_mb']:>10.1f}"
+                     f"{r['min_cos']:>10.4f}{r['mean_cos']:>10.4f}{flag}")
+    return "\n".join(lines)
+
+
+def run_benchmarks(sizes=(50, 200, 1000), repeats=5, sources=("reddit", "news", "hn", "ddg"),
+                   labelers=("extractive",), methods=CLUSTER_METHODS, fixture_dir=None):
+    fixture_items = load_fixture_items(fixture_dir)
+
+    rows = bench_analyze(repeats)
+    if fixture_items:
+        rows += bench_fetch(repeats, list(sources), fixture_dir)
+    else:
+        # Replaying nothing would time an empty fan-out
+        print("[Benchmark] No scraper fixtures found: skipping the fetch stage, and the CPU stages run "
+              "on synthetic text only. Record some by running the server once with "
+              "THOUGHTNET_SCRAPER_MODE=record and a few real queries; they are saved under "
+              "THOUGHTNET_FIXTURE_DIR.")
+    for size in sizes:
+        corpus = build_corpus(size, fixture_items)
+        rows += bench_cpu_stages(size, repeats, corpus, labelers=labelers, methods=methods)
+    return rows
+
+
+def _variant(row):
+    return row.get("method") or row.get("labeler") or row.get("backend") or ""
+
+
+def format_table(rows):
+    # Columns as wide as their longest entry
+    stage_w = max([len("stage")] + [len(r["stage"]) for r in rows]) + 2
+    variant_w = max([len("variant")] + [len(_variant(r)) for r in rows]) + 2
+    header = f"{'stage':<{stage_w}}{'variant':<{variant_w}}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'items/s':>11}{'peak MB':>10}"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        tput = f"{r['throughput']:.1f}" if r["throughput"] else "-"
+        lines.append(f"{r['stage']:<{stage_w}}{_variant(r):<{variant_w}}{r['n']:>6}{r['p50_ms']:>11.2f}"
+                     f"{r['p95_ms']:>11.2f}{tput:>11}{r['peak_rss_mb']:>10.1f}")
+    return "\n".join(lines)
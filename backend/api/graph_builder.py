@@ -1,98 +1,244 @@
-import uuid
+import hashlib
 
-def build_graph_response(query, sub_queries_data, clusters):
+ROOT_ID = "root"
+
+# Column order of the compact encoding (see compact_graph)
+COMPACT_FIELDS = {
+    "nodes": ("id", "label", "type", "size", "evidence"),
+    "edges": ("source", "target", "weight"),
+    "evidence": ("text", "url", "source", "duplicates"),
+}
+
+
+def _digest_id(prefix, *parts):
+    # Content-addressed node id: the same graph content always gets the same
+    # ids, across requests and processes (unlike uuid4 or the salted hash())
+    h = hashlib.sha1("\x00".join(parts).encode("utf-8"))
+    return f"{prefix}_{h.hexdigest()[:12]}"
+
+
+def _sub_query_node_id(query, sq):
+    # Check if SQ is significantly different from Root
+    is_root_alias = (sq.lower().strip() == query.lower().strip())
+    if is_root_alias:
+        return ROOT_ID
+    return _digest_id("sq", sq)
+
+
+class EvidenceTable:
     """
-    Constructs a hierarchical graph for the frontend.
-    
-    Structure:
-    - Root Node (Original Query)
-      - Sub-Query Nodes (Broad Categories)
-        - Cluster Nodes (Specific Topics)
-          - Leaf Nodes (Evidence/Articles)
-    
-    If no sub-queries (simple query), Root -> Cluster -> Leaves.
+    Evidence rows ({ "text", "url", "source", "duplicates"? }) stored once per
+    response; evidence nodes refer to them by index, so an article that
+    backs several clusters isn't repeated.
     """
-    
-    nodes = []
-    edges = []
-    
-    # 1. Root Node
-    root_id = "root"
-    nodes.append({
-        "id": root_id,
+
+    def __init__(self):
+        self.rows = []
+        self._index = {}
+        self._sent = 0
+
+    def add(self, item):
+        key = (item['content'], item.get('url'))
+        if key not in self._index:
+            row = {"text": item['content'], "url": item.get('url'), "source": item.get('source')}
+            # Near-duplicates merged into this item (same story elsewhere)
+            if item.get('duplicates'):
+                row["duplicates"] = item['duplicates']
+            self._index[key] = len(self.rows)
+            self.rows.append(row)
+        return self._index[key]
+
+    def take_new(self):
+        """
+        `(offset, rows)` added since the last call, for streamed fragments.
+        """
+        offset = self._sent
+        self._sent = len(self.rows)
+        return offset, self.rows[offset:]
+
+
+def build_root_nodes(query, sub_queries):
+    """
+    Root node plus one node per sub-query (sub-queries that just repeat the
+    original query hang their clusters straight off the root).
+    Returns `(nodes, edges)`.
+    """
+    nodes = [{
+        "id": ROOT_ID,
         "label": query,
         "type": "root",
         "size": 30
-    })
-    
+    }]
+    edges = []
+
     # Track existing nodes to avoid dupes if any
-    seen_nodes = set([root_id])
-
-    # If we have distinct sub-queries, create nodes for them.
-    # If sub-queries list just contains the original query, skip this layer.
-    
-    # We need to map which data belongs to which sub-query.
-    # The 'sub_queries_data' input is expected to be a dict: { "SubQuery String": [List of results] }
-    # 'clusters' is expected to be: { "SubQuery String": { "cluster_label": [Items] } }
-    
-    for sq, cluster_map in clusters.items():
-        # Check if SQ is significantly different from Root
-        is_root_alias = (sq.lower().strip() == query.lower().strip())
-        
-        if is_root_alias:
-            sq_node_id = root_id
-        else:
-            sq_node_id = f"sq_{abs(hash(sq))}"
-            if sq_node_id not in seen_nodes:
-                nodes.append({
-                    "id": sq_node_id,
-                    "label": sq,
-                    "type": "sub_topic",
-                    "size": 20
-                })
-                edges.append({
-                    "source": root_id,
-                    "target": sq_node_id
-                })
-                seen_nodes.add(sq_node_id)
-        
-        # Now add Clusters for this Sub-Query
-        for c_label, items in cluster_map.items():
-            cluster_id = f"cl_{uuid.uuid4().hex[:8]}"
-            
-            # Cluster Node (Thought Cloud)
+    seen_nodes = set([ROOT_ID])
+
+    for sq in sub_queries:
+        sq_node_id = _sub_query_node_id(query, sq)
+        if sq_node_id not in seen_nodes:
             nodes.append({
-                "id": cluster_id,
-                "label": c_label, # Summary of the thought
-                "type": "thought_cloud",
-                "size": 15
+                "id": sq_node_id,
+                "label": sq,
+                "type": "sub_topic",
+                "size": 20
+            })
+            edges.append({
+                "source": ROOT_ID,
+                "target": sq_node_id
             })
-            
+            seen_nodes.add(sq_node_id)
+
+    return nodes, edges
+
+
+def _cluster_nodes(parent_id, c_label, items, evidence):
+    """
+    One cluster node plus its evidence leaves. Returns `(cluster_id, nodes, edges)`.
+    The id is derived from the parent and the member set.
+    """
+    cluster_id = _digest_id("cl", parent_id, *sorted(item['content'] for item in items))
+
+    # Cluster Node (Thought Cloud)
+    nodes = [{
+        "id": cluster_id,
+        "label": c_label, # Summary of the thought
+        "type": "thought_cloud",
+        "size": 15
+    }]
+    edges = []
+
+    # Add Leaves (Evidence)
+    # Limit leaves per cluster to avoid graph explosion
+    for i, item in enumerate(items[:5]):
+        leaf_id = _digest_id("leaf", cluster_id, item['content'])
+        nodes.append({
+            "id": leaf_id,
+            "label": item['content'][:50] + "...", # Truncate for label
+            "evidence": evidence.add(item), # full text, url and source live in the evidence table
+            "type": "evidence",
+            "size": 10
+        })
+        edges.append({
+            "source": cluster_id,
+            "target": leaf_id
+        })
+
+    return cluster_id, nodes, edges
+
+
+def build_cluster_nodes(query, sq, cluster_map, evidence):
+    """
+    Cluster and evidence nodes of one sub-query.
+    `cluster_map` is { "cluster_label": [Items] }; evidence rows go into the
+    `evidence` EvidenceTable. Returns `(nodes, edges)`.
+    """
+    nodes = []
+    edges = []
+    sq_node_id = _sub_query_node_id(query, sq)
+
+    for c_label, items in cluster_map.items():
+        cluster_id, c_nodes, c_edges = _cluster_nodes(sq_node_id, c_label, items, evidence)
+        nodes.extend(c_nodes)
+        edges.append({
+            "source": sq_node_id,
+            "target": cluster_id
+        })
+        edges.extend(c_edges)
+
+    return nodes, edges
+
+
+def build_shared_cluster_nodes(query, shared_clusters, evidence):
+    """
+    Cluster and evidence nodes of globally clustered results (see
+    api.processing.process_global). Every cluster hangs off each sub-query
+    it has items from, with the share of its items as the edge weight.
+    Returns `(nodes, edges)`.
+    """
+    nodes = []
+    edges = []
+
+    for cluster in shared_clusters:
+        cluster_id, c_nodes, c_edges = _cluster_nodes(ROOT_ID, cluster["label"], cluster["items"], evidence)
+        nodes.extend(c_nodes)
+        # Sub-queries that are just the root collapse onto one edge
+        weights = {}
+        for sq, weight in cluster["sub_queries"].items():
+            sq_node_id = _sub_query_node_id(query, sq)
+            weights[sq_node_id] = max(weights.get(sq_node_id, 0), weight)
+        for sq_node_id, weight in weights.items():
             edges.append({
                 "source": sq_node_id,
-                "target": cluster_id
+                "target": cluster_id,
+                "weight": weight
             })
-            
-            # Add Leaves (Evidence)
-            # Limit leaves per cluster to avoid graph explosion
-            for i, item in enumerate(items[:5]): 
-                leaf_id = f"leaf_{uuid.uuid4().hex[:8]}"
-                nodes.append({
-                    "id": leaf_id,
-                    "label": item['content'][:50] + "...", # Truncate for label
-                    "full_text": item['content'],
-                    "url": item.get('url'),
-                    "source": item.get('source'),
-                    "type": "evidence",
-                    "size": 10
-                })
-                edges.append({
-                    "source": cluster_id,
-                    "target": leaf_id
-                })
+        edges.extend(c_edges)
+
+    return nodes, edges
+
+
+def build_graph_response(query, sub_queries_data, clusters, shared_clusters=None):
+    """
+    Constructs a hierarchical graph for the frontend.
+
+    Structure:
+    - Root Node (Original Query)
+      - Sub-Query Nodes (Broad Categories)
+        - Cluster Nodes (Specific Topics)
+          - Leaf Nodes (Evidence/Articles)
+
+    If no sub-queries (simple query), Root -> Cluster -> Leaves.
+
+    The 'sub_queries_data' input is expected to be a dict: { "SubQuery String": [List of results] }
+    'clusters' is expected to be: { "SubQuery String": { "cluster_label": [Items] } }
+    Only sub-queries that produced clusters get a node.
+
+    With `shared_clusters` (global clustering, see process_global) the
+    clusters are shared between sub-queries instead: each one is linked to
+    every sub-query it draws items from, by weighted edges.
+
+    Evidence nodes carry an index into the top-level "evidence" list
+    ({ "text", "url", "source" }) instead of their own copy of the text.
+    Node ids are content hashes, so the same results give the same graph.
+    """
+    evidence = EvidenceTable()
+    if shared_clusters is not None:
+        sub_queries = list(dict.fromkeys(sq for c in shared_clusters for sq in c["sub_queries"]))
+        nodes, edges = build_root_nodes(query, sub_queries)
+        c_nodes, c_edges = build_shared_cluster_nodes(query, shared_clusters, evidence)
+        nodes.extend(c_nodes)
+        edges.extend(c_edges)
+    else:
+        nodes, edges = build_root_nodes(query, list(clusters.keys()))
+
+    for sq, cluster_map in clusters.items():
+        sq_nodes, sq_edges = build_cluster_nodes(query, sq, cluster_map, evidence)
+        nodes.extend(sq_nodes)
+        edges.extend(sq_edges)
 
     return {
-        "root_id": root_id,
+        "root_id": ROOT_ID,
         "nodes": nodes,
-        "edges": edges
+        "edges": edges,
+        "evidence": evidence.rows
     }
+
+
+def compact_graph(graph):
+    """
+    Column encoding of a graph: "nodes", "edges" and "evidence" become lists
+    of rows in the column order given under "fields" (trailing empty
+    columns dropped), so keys aren't repeated for every node.
+    """
+    out = {k: v for k, v in graph.items() if k not in COMPACT_FIELDS}
+    out["fields"] = {key: list(fields) for key, fields in COMPACT_FIELDS.items()}
+    for key, fields in COMPACT_FIELDS.items():
+        rows = []
+        for obj in graph.get(key, []):
+            row = [obj.get(f) for f in fields]
+            while row and row[-1] is None:
+                row.pop()
+            rows.append(row)
+        out[key] = rows
+    return out
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import (
+    CLUSTER_METHODS, bench_embedding_backends, build_corpus, format_backends, format_table,
+    load_fixture_items, run_benchmarks,
+)
+
+
+def _csv(value):
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the ThoughtNet pipeline stages (p50/p95 latency, throughput, peak RSS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="50,200,1000", help="Corpus sizes, comma separated")
+        parser.add_argument("--repeats", type=int, default=5, help="Timed runs per stage")
+        parser.add_argument("--sources", default="reddit,news,hn,ddg", help="Sources to replay")
+        parser.add_argument("--labelers", default="extractive",
+                            help="Labelers to time (bart is slow: add it explicitly)")
+        parser.add_argument("--methods", default=",".join(CLUSTER_METHODS), help="Clustering methods")
+        parser.add_argument("--fixtures", default=None, help="Fixture directory (default THOUGHTNET_FIXTURE_DIR)")
+        parser.add_argument("--json", dest="json_path", default=None, help="Also write the rows to this file")
+        parser.add_argument("--backends", default=None,
+                            help="Only compare embedding backends (e.g. torch-int8,onnx,torch): "
+                                 "sentences/sec, RSS and cosine parity with fp32; fails on a parity miss")
+
+    def handle(self, *args, **options):
+        if options["backends"]:
+            return self.handle_backends(options)
+
+        rows = run_benchmarks(
+            sizes=[int(s) for s in _csv(options["sizes"])],
+            repeats=options["repeats"],
+            sources=_csv(options["sources"]),
+            labelers=_csv(options["labelers"]),
+            methods=_csv(options["methods"]),
+            fixture_dir=options["fixtures"],
+        )
+        self.stdout.write(format_table(rows))
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump(rows, f, indent=2)
+            self.stdout.write(f"Wrote {len(rows)} rows to {options['json_path']}")
+
+    def handle_backends(self, options):
+        size = max(int(s) for s in _csv(options["sizes"]))
+        corpus = build_corpus(size, load_fixture_items(options["fixtures"]))
+        rows = bench_embedding_backends(_csv(options["backends"]), corpus, options["repeats"])
+        self.stdout.write(format_backends(rows))
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump(rows, f, indent=2)
+
+        failed = [r["backend"] for r in rows if not r["ok"]]
+        if failed:
+            raise CommandError(f"Embedding parity below tolerance for: {', '.join(failed)}")
@@ -0,0 +1,150 @@
+"""
+Per-stage timing spans and Prometheus-style histograms.
+
+    with span("embed", items=len(texts)):
+        ...
+
+Every span is observed into the `thoughtnet_stage_seconds` histogram
+(labelled by stage plus any string labels such as `source`) and, while a
+`collect_timings()` block is active, also appended to that block's list,
+which is how a request can return its own `timings`.
+"""
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import threading
+import os
+import time
+
+# /api/metrics/ only answers loopback clients unless this is set
+METRICS_PUBLIC = os.getenv("THOUGHTNET_METRICS_PUBLIC", "False") == "True"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}  # sorted label items -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        def fmt_labels(items):
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{fmt_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_count{fmt_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_sum{fmt_labels(key)} {series[-1]}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+STAGE_SECONDS = Histogram(
+    "thoughtnet_stage_seconds",
+    "Time spent in each ThoughtNet pipeline stage (fetch spans carry source and outcome).",
+)
+
+# Spans of the current request (None outside collect_timings())
+_timings = contextvars.ContextVar("thoughtnet_timings", default=None)
+# Inside worker-pool jobs spans are only collected; the caller records them
+_deferred = contextvars.ContextVar("thoughtnet_timings_deferred", default=False)
+
+
+def record_span(record):
+    """
+    Observe a finished span record ({"stage", "seconds", **labels}).
+    """
+    labels = {k: v for k, v in record.items() if k not in ("seconds",) and isinstance(v, str)}
+    if not _deferred.get():
+        STAGE_SECONDS.observe(record["seconds"], **labels)
+    collected = _timings.get()
+    if collected is not None:
+        collected.append(record)
+
+
+class Span:
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+
+    def set(self, **labels):
+        self.labels.update(labels)
+
+
+@contextlib.contextmanager
+def span(stage, **labels):
+    """
+    Times the block as `stage`. Labels can be added on the way with
+    `.set()`, e.g. the outcome of a fetch. Non-string labels (counts) are
+    kept in the request timings but not used as histogram labels.
+    """
+    s = Span(stage, labels)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except (asyncio.CancelledError, GeneratorExit):
+        s.labels.setdefault("outcome", "cancelled")
+        raise
+    except BaseException:
+        s.labels.setdefault("outcome", "error")
+        raise
+    finally:
+        record_span({"stage": stage, **s.labels, "seconds": time.perf_counter() - t0})
+
+
+@contextlib.contextmanager
+def collect_timings(defer=False):
+    """
+    Collects every span finished inside the block (including in tasks
+    spawned from it) into the yielded list. With `defer=True` spans are not
+    observed here; the caller passes them to record_span() itself (used to
+    carry spans back from worker threads/processes).
+    """
+    collected = []
+    token = _timings.set(collected)
+    defer_token = _deferred.set(defer)
+    try:
+        yield collected
+    finally:
+        _deferred.reset(defer_token)
+        _timings.reset(token)
+
+
+def summarize_timings(records):
+    """
+    Request timings for the API response, in milliseconds.
+    """
+    return [
+        {**{k: v for k, v in r.items() if k != "seconds"}, "ms": round(r["seconds"] * 1000, 2)}
+        for r in records
+    ]
+
+
+def render_metrics():
+    return STAGE_SECONDS.render() + "\n"
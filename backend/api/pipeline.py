@@ -1,69 +1,60 @@
-from api.utils.reddit_scraper import fetch_from_reddit
-from api.utils.news_scraper import fetch_from_newsapi
-from api.utils.hackernews import fetch_from_hackernews
+from api.scrapers.registry import resolve_sources
 from api.utils.embeddings import embed_texts
-from api.utils.clustering import cluster_embeddings, evaluate_clusters
-from api.utils.labeling import label_cluster
+from api.utils.clustering import cluster_embeddings
+from api.utils.labeling import label_cluster, resolve_labeler
+from api.utils.near_duplicates import near_duplicate_groups
 from api.utils.semantic_analysis import analyze_query
-import time
+from api.metrics import span
 
 
-def run_pipeline(query="AI", sources=None, clustering_method="kmeans"):
+def run_pipeline(query="AI", sources=None, clustering_method="kmeans", labeler=None):
     if sources is None:
         sources = ["reddit", "news", "hn"]
 
     # 1. Semantic Analysis
-    start_time = time.time()
-    sub_queries, complexity = analyze_query(query)
+    with span("analyze"):
+        sub_queries, complexity = analyze_query(query)
     print(f"Sub-queries: {sub_queries}, Complexity: {complexity}")
-    print(f"[TIMING] Semantic Analysis took: {time.time() - start_time:.2f}s")
 
     all_texts = []
 
     # 2. Fetch data for each sub-query
-    fetch_start_time = time.time()
-    for sub_q in sub_queries:
-        sub_fetch_start = time.time()
-        print(f"Fetching for sub-query: {sub_q}")
-        texts = []
-        if "reddit" in sources:
-            t0 = time.time()
-            texts.extend(fetch_from_reddit(sub_q, limit=10))
-            print(f"  [TIMING] Reddit fetch for '{sub_q}' took: {time.time() - t0:.2f}s")
-        if "news" in sources:
-            t0 = time.time()
-            texts.extend(fetch_from_newsapi(sub_q, page_size=10))
-            print(f"  [TIMING] NewsAPI fetch for '{sub_q}' took: {time.time() - t0:.2f}s")
-        if "hn" in sources:
-            t0 = time.time()
-            texts.extend(fetch_from_hackernews(limit=10)) # HN search might not support complex queries well
-            print(f"  [TIMING] HN fetch for '{sub_q}' took: {time.time() - t0:.2f}s")
-        
-        all_texts.extend(texts)
-        print(f"[TIMING] Total fetch for sub-query '{sub_q}' took: {time.time() - sub_fetch_start:.2f}s")
-    
-    print(f"[TIMING] Total Data Fetching took: {time.time() - fetch_start_time:.2f}s")
+    with span("fetch_all"):
+        for sub_q in sub_queries:
+            print(f"Fetching for sub-query: {sub_q}")
+            texts = []
+            # Only sources with a legacy sync fetcher take part in this pipeline
+            for spec in resolve_sources(sources):
+                if spec.sync_fetch is None:
+                    continue
+                with span("fetch", source=spec.name) as s:
+                    fetched = spec.sync_fetch(sub_q, 10)
+                    s.set(outcome="ok", items=len(fetched))
+                texts.extend(fetched)
+
+            all_texts.extend(texts)
 
     if not all_texts:
         return {"error": "No data fetched."}
 
-    # Remove duplicates
-    all_texts = list(set(all_texts))
+    # Remove duplicates, near-duplicates included (first occurrence wins)
+    with span("dedupe"):
+        all_texts = list(dict.fromkeys(all_texts))
+        all_texts = [all_texts[group[0]] for group in near_duplicate_groups(all_texts)]
 
     # 3. Embed and Cluster
-    embed_start = time.time()
-    embeddings = embed_texts(all_texts)
-    print(f"[TIMING] Embedding {len(all_texts)} texts took: {time.time() - embed_start:.2f}s")
+    with span("embed", items=len(all_texts)):
+        embeddings = embed_texts(all_texts)
     
     # Dynamic clustering based on complexity if method is kmeans
-    if clustering_method == "kmeans":
-        # Ensure we don't ask for more clusters than samples
-        n_clusters = min(complexity, len(all_texts))
-        labels, cluster_metrics = cluster_embeddings(embeddings, method=clustering_method, n_clusters=n_clusters)
-    else:
-        labels, cluster_metrics = cluster_embeddings(embeddings, method=clustering_method)
-        
-    metrics = evaluate_clusters(embeddings, labels)
+    with span("cluster", method=clustering_method, items=len(all_texts)):
+        if clustering_method == "kmeans":
+            # Ensure we don't ask for more clusters than samples
+            n_clusters = min(complexity, len(all_texts))
+            labels, metrics = cluster_embeddings(embeddings, method=clustering_method, n_clusters=n_clusters,
+                                                 compute_metrics=True)
+        else:
+            labels, metrics = cluster_embeddings(embeddings, method=clustering_method, compute_metrics=True)
 
 
     clusters = {}
@@ -73,15 +64,16 @@ def run_pipeline(query="AI", sources=None, clustering_method="kmeans"):
         clusters.setdefault(str(cluster_id), []).append(text)
 
 
-    for cid, c_texts in clusters.items():
-        cluster_labels[cid] = label_cluster(c_texts)
+    with span("summarise", labeler=resolve_labeler(labeler), clusters=len(clusters)):
+        for cid, c_texts in clusters.items():
+            cluster_labels[cid] = label_cluster(c_texts, mode=labeler)
 
     return {
         "query": query,
         "sub_queries": sub_queries,
         "sources": sources,
         "texts": all_texts,
-        "labels": labels,
-        "metrics": {**metrics, **cluster_metrics},
+        "labels": labels.tolist(),
+        "metrics": metrics,
         "cluster_labels": cluster_labels
     }
@@ -0,0 +1,250 @@
+import os
+
+import numpy as np
+from api.metrics import span
+from api.utils.embeddings import embed_texts
+from api.utils.clustering import AUTO_K_MAX, cluster_embeddings
+from api.utils.labeling import generate_summaries, resolve_labeler
+from api.utils.near_duplicates import headline, near_duplicate_groups
+
+
+# Minimum cosine similarity between an item and its sub-query for the item to
+# stay (MiniLM scores unrelated text around 0-0.15); -1 keeps everything
+RELEVANCE_THRESHOLD = float(os.getenv("THOUGHTNET_RELEVANCE_THRESHOLD", "0.2"))
+
+# Clustering scope: "sub_query" clusters each sub-query on its own, "global"
+# clusters all of them together (see process_global)
+CLUSTER_SCOPES = ("sub_query", "global")
+CLUSTER_SCOPE = os.getenv("THOUGHTNET_CLUSTER_SCOPE", "sub_query")
+# Max clusters for the global corpus (it's several sub-queries' worth of items)
+GLOBAL_K_MAX = int(os.getenv("THOUGHTNET_GLOBAL_K_MAX", "12"))
+
+
+def resolve_cluster_scope(scope=None):
+    scope = (scope or CLUSTER_SCOPE).lower()
+    if scope not in CLUSTER_SCOPES:
+        raise ValueError(f"Unsupported cluster scope: {scope}")
+    return scope
+
+
+def relevance_mask(embeddings, sq_vector, threshold=None):
+    """
+    Which rows of `embeddings` are about the sub-query: one matrix-vector
+    product, since all vectors are unit length.
+    """
+    threshold = RELEVANCE_THRESHOLD if threshold is None else threshold
+    return embeddings @ sq_vector >= threshold
+
+
+def _prepare(sq_data):
+    """
+    Dedupe -> Near-dedupe -> Embed -> Filter, shared by both clustering scopes.
+    Returns `(sq_items, text_rows, all_embeddings)`: the surviving items per
+    sub-query, and the embedding row of every distinct text (items and
+    sub-queries alike).
+    """
+    # Deduplicate based on content, per sub-query, and collect the distinct
+    # texts of ALL sub-queries so they go through the model in one batch
+    # (a sentence fetched under two sub-queries is only encoded once).
+    sq_items = {}
+    distinct = {} # { content: headline }, in order of first appearance
+    with span("dedupe"):
+        for sq, items in sq_data.items():
+            unique_items = []
+            seen_texts = set()
+            for it in items:
+                if it['content'] not in seen_texts:
+                    unique_items.append(it)
+                    seen_texts.add(it['content'])
+                    distinct.setdefault(it['content'], headline(it))
+            if unique_items:
+                sq_items[sq] = unique_items
+
+    # Near-duplicates (syndicated headlines, cross-posts) collapse onto the
+    # earliest of them: only that text is embedded, and each sub-query keeps
+    # one item per group with the others' links under "duplicates"
+    with span("near_dedupe", items=len(distinct)) as s:
+        texts = list(distinct)
+        rep_of = {}
+        for group in near_duplicate_groups(list(distinct.values())):
+            for i in group:
+                rep_of[texts[i]] = texts[group[0]]
+        s.set(merged=len(texts) - len(set(rep_of.values())))
+        sq_items = {sq: _collapse(items, rep_of) for sq, items in sq_items.items()}
+
+    all_texts = list(dict.fromkeys(rep_of.values()))
+    rep_rows = {t: row for row, t in enumerate(all_texts)}
+    text_rows = {t: rep_rows[rep] for t, rep in rep_of.items()} # { content: row in all_embeddings }
+
+    # The sub-queries go into the same batch: their vectors drive the relevance filter
+    for sq in sq_items:
+        if sq not in text_rows:
+            text_rows[sq] = len(all_texts)
+            all_texts.append(sq)
+
+    print(f"  Embedding {len(all_texts)} unique items across {len(sq_items)} sub-queries...")
+    with span("embed", items=len(all_texts)):
+        all_embeddings = embed_texts(all_texts)
+
+    # Relevance Filter: drop noise (e.g. random Chinese results or unrelated
+    # topics) by how close each item is to its own sub-query
+    with span("filter") as s:
+        dropped = 0
+        for sq, items in list(sq_items.items()):
+            rows = [text_rows[it['content']] for it in items]
+            keep = np.flatnonzero(relevance_mask(all_embeddings[rows], all_embeddings[text_rows[sq]]))
+            dropped += len(items) - len(keep)
+            if len(keep):
+                sq_items[sq] = [items[i] for i in keep]
+            else:
+                del sq_items[sq]
+        s.set(dropped=dropped)
+
+    return sq_items, text_rows, all_embeddings
+
+
+def _collapse(items, rep_of):
+    """
+    One item per group (`rep_of` maps content to a group key). Items coming
+    out of the scraper cache are shared between requests, so a merged item
+    is a copy carrying the others' provenance in "duplicates"
+    ([{ "url", "source" }]).
+    """
+    kept = {} # { representative text: item }
+    copied = set()
+    for it in items:
+        rep = rep_of[it['content']]
+        if rep not in kept:
+            kept[rep] = it
+            continue
+        # Its own provenance plus whatever it had already absorbed
+        known = {kept[rep].get("url")} | {d["url"] for d in kept[rep].get("duplicates", [])}
+        new = [d for d in [{"url": it.get("url"), "source": it.get("source")}] + it.get("duplicates", [])
+               if d["url"] not in known]
+        if not new:
+            continue
+        if rep not in copied:
+            kept[rep] = dict(kept[rep], duplicates=list(kept[rep].get("duplicates", [])))
+            copied.add(rep)
+        kept[rep]["duplicates"].extend(new)
+    return list(kept.values())
+
+
+def _cluster(embeddings, k_cap):
+    # If texts < 2, we can't do KMeans with n=2. Just put all in one cluster.
+    if len(embeddings) < 2:
+        return np.zeros(len(embeddings), dtype=np.int64)
+    # Let the silhouette pick N, up to ~3 items per cluster
+    # (auto_kmeans caps it below the item count itself)
+    k_max = max(2, min(len(embeddings) // 3, k_cap))
+    with span("cluster", method="kmeans-auto", items=len(embeddings)):
+        labels, _ = cluster_embeddings(embeddings, method="kmeans", n_clusters="auto", k_max=k_max)
+    return labels
+
+
+def _summarise(groups, labeler):
+    """
+    Labels for `groups` ([(items, member_embeddings), ...]) in one batched
+    pass (BART is slow, so one padded generation beats a call per cluster).
+    """
+    with span("summarise", labeler=resolve_labeler(labeler), clusters=len(groups)):
+        return generate_summaries(
+            [[x['content'] for x in group_items] for group_items, _ in groups],
+            mode=labeler,
+            embedding_groups=[group_emb for _, group_emb in groups],
+        )
+
+
+def _unique_label(label, taken):
+    # "Label", "Label (2)", "Label (3)", ...
+    candidate, n = label, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{label} ({n})"
+    return candidate
+
+
+def process_sub_queries(sq_data, labeler=None):
+    """
+    CPU-bound half of the pipeline: Dedupe -> Embed -> Filter -> Cluster -> Label
+    (see _prepare for the first steps).
+
+    Takes { "sub_query": [items] } and returns
+    { "sub_query": { "cluster_label": [items] } }.
+    The async pipeline runs this in the worker pool (see api.workers), so it
+    has to stay a plain module-level function with picklable arguments.
+    """
+    final_clusters = {} # { "sub_query": { "cluster_label": [items] } }
+    sq_groups = {} # { "sub_query": [([items], embeddings), ...] } before labeling
+
+    sq_items, text_rows, all_embeddings = _prepare(sq_data)
+
+    for sq, items in sq_items.items():
+        texts = [item['content'] for item in items]
+
+        # Scatter the shared vectors back to this sub-query
+        print(f"  Processing {len(texts)} items for '{sq}'...")
+        embeddings = all_embeddings[[text_rows[t] for t in texts]]
+        labels = _cluster(embeddings, AUTO_K_MAX)
+        
+        # Group by label (keep member embeddings for the fast labelers)
+        sq_groups[sq] = [
+            ([items[i] for i in members], embeddings[members])
+            for members in (np.flatnonzero(labels == lab) for lab in np.unique(labels))
+        ]
+        
+    # Generate Summaries for every cluster of every sub-query in one batched pass
+    flat_groups = [(sq, g) for sq, groups in sq_groups.items() for g in groups]
+    summaries = _summarise([g for _, g in flat_groups], labeler)
+    
+    for (sq, (group_items, _)), summary_label in zip(flat_groups, summaries):
+        sq_clusters = final_clusters.setdefault(sq, {})
+        # Two clusters can get the same label (e.g. identical BART summaries);
+        # keyed by label, the second would overwrite the first
+        sq_clusters[_unique_label(summary_label, sq_clusters)] = group_items
+
+    return final_clusters
+
+
+def process_global(sq_data, labeler=None):
+    """
+    Like process_sub_queries, but clusters the deduplicated corpus of ALL
+    sub-queries once, so an idea found under several sub-queries becomes one
+    cluster (one fit, one summary) instead of one per sub-query.
+
+    Returns a list of shared clusters:
+    [{ "label", "items", "sub_queries": { "sub_query": weight } }]
+    where weight is the share of the cluster's items fetched for that
+    sub-query (an item found under two sub-queries counts for both).
+    """
+    sq_items, text_rows, all_embeddings = _prepare(sq_data)
+
+    owners = {} # { embedding row: [sub-queries it was fetched for] }
+    for sq, sq_list in sq_items.items():
+        for it in sq_list:
+            owners.setdefault(text_rows[it['content']], []).append(sq)
+    # One item per row across all sub-queries (near-duplicates share a row already)
+    items = _collapse([it for sq_list in sq_items.values() for it in sq_list], text_rows)
+
+    print(f"  Clustering {len(items)} items across {len(sq_items)} sub-queries at once...")
+    embeddings = all_embeddings[[text_rows[it['content']] for it in items]]
+    labels = _cluster(embeddings, GLOBAL_K_MAX)
+
+    groups = [
+        ([items[i] for i in members], embeddings[members])
+        for members in (np.flatnonzero(labels == lab) for lab in np.unique(labels))
+    ]
+    summaries = _summarise(groups, labeler)
+
+    shared = []
+    for (group_items, _), summary_label in zip(groups, summaries):
+        counts = {}
+        for it in group_items:
+            for sq in owners[text_rows[it['content']]]:
+                counts[sq] = counts.get(sq, 0) + 1
+        shared.append({
+            "label": summary_label,
+            "items": group_items,
+            "sub_queries": {sq: round(c / len(group_items), 3) for sq, c in counts.items()},
+        })
+    return shared
@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+from api.scrapers.registry import canonical_name
+from api.utils.ttl_cache import TTLCache
+
+# Full /api/cluster/ responses, keyed by normalised query + source set
+RESPONSE_CACHE_TTL = int(os.getenv("THOUGHTNET_RESPONSE_CACHE_TTL", "900"))
+RESPONSE_CACHE_SIZE = int(os.getenv("THOUGHTNET_RESPONSE_CACHE_SIZE", "256"))
+
+_responses = TTLCache(maxsize=RESPONSE_CACHE_SIZE, max_age=RESPONSE_CACHE_TTL)
+_inflight = {}  # cache key -> task computing it
+
+
+def response_key(query, sources, **options):
+    """
+    Same question, same sources (in any order), same options -> same key.
+    """
+    normalized = " ".join(query.lower().split())
+    source_set = sorted({canonical_name(s) for s in sources})
+    opts = ",".join(f"{k}={options[k]}" for k in sorted(options))
+    return f"{normalized}|{','.join(source_set)}|{opts}"
+
+
+async def _compute_and_store(key, compute, cacheable):
+    try:
+        result = await compute()
+        if cacheable is None or cacheable(result):
+            _responses.set(key, result)
+        return result
+    finally:
+        _inflight.pop(key, None)
+
+
+async def get_or_compute(key, compute, cacheable=None):
+    """
+    Returns the cached response for `key`, or awaits `compute()` to build it
+    (and stores it, unless `cacheable(result)` says otherwise).
+
+    Concurrent callers with the same key share one in-flight computation
+    instead of each running the whole pipeline. The computation is shielded,
+    so one client disconnecting doesn't cancel it for the others.
+    """
+    entry = _responses.get(key)
+    if entry is not None:
+        return entry[0]
+
+    loop = asyncio.get_running_loop()
+    task = _inflight.get(key)
+    if task is None or task.get_loop() is not loop:
+        task = loop.create_task(_compute_and_store(key, compute, cacheable))
+        _inflight[key] = task
+    return await asyncio.shield(task)
@@ -1,5 +1,7 @@
 from duckduckgo_search import DDGS
+from duckduckgo_search.exceptions import RatelimitException
 import asyncio
+from api.scrapers.scheduler import RateLimited
 
 async def fetch_from_duckduckgo(query, limit=10):
     """
@@ -34,12 +36,15 @@ async def fetch_from_duckduckgo(query, limit=10):
                 "source": "Web Search (DDG)",
                 "url": link,
                 "meta": {
+                    "title": title,
                     "source_name": "DuckDuckGo",
                 }
             })
             
         return results
 
+    except RatelimitException:
+        raise RateLimited("ddg")
     except Exception as e:
         print(f"Error fetching from DDG: {e}")
         return []
@@ -1,5 +1,6 @@
-import httpx
 import asyncio
+from api.scrapers.clients import get_http_client
+from api.scrapers.scheduler import RateLimited, parse_retry_after
 
 async def fetch_item(client, item_id):
     try:
@@ -17,32 +18,46 @@ async def fetch_from_hackernews(query, limit=10):
         return []
 
     # Using Algolia API is much faster/better for search than iterating IDs
-    url = f"http://hn.algolia.com/api/v1/search?query={query}&tags=story&hitsPerPage={limit}"
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, timeout=5.0)
-            if response.status_code != 200:
-                print(f"HN Search failed: {response.status_code}")
-                return []
-            
-            data = response.json()
-            results = []
-            
-            for hit in data.get("hits", []):
-                title = hit.get("title", "")
-                url = hit.get("url", "")
-                # We return a dict to preserve source metadata for the Graph
-                if title:
-                    results.append({
-                        "content": title,
-                        "source": "HackerNews",
-                        "url": url if url else f"https://news.ycombinator.com/item?id={hit.get('objectID')}",
-                        "meta": hit
-                    })
-            
-            return results
+    url = "https://hn.algolia.com/api/v1/search"
+    params = {"query": query, "tags": "story", "hitsPerPage": limit}
 
-        except Exception as e:
-            print(f"Error fetching from HN (Async): {e}")
+    # Shared keep-alive client (see api.scrapers.clients)
+    client = get_http_client()
+    try:
+        response = await client.get(url, params=params, timeout=5.0)
+        if response.status_code == 429:
+            raise RateLimited("hn", parse_retry_after(response.headers.get("Retry-After")))
+        if response.status_code != 200:
+            print(f"HN Search failed: {response.status_code}")
             return []
+        
+        data = response.json()
+        results = []
+        
+        for hit in data.get("hits", []):
+            title = hit.get("title", "")
+            url = hit.get("url", "")
+            # We return a dict to preserve source metadata for the Graph
+            if title:
+                results.append({
+                    "content": title,
+                    "source": "HackerNews",
+                    "url": url if url else f"https://news.ycombinator.com/item?id={hit.get('objectID')}",
+                    # Only what we use: a full Algolia hit (highlight results,
+                    # tags...) is several KB and rides along to the workers and caches
+                    "meta": {
+                        "points": hit.get("points"),
+                        "num_comments": hit.get("num_comments"),
+                        "author": hit.get("author"),
+                        "created_at": hit.get("created_at"),
+                        "objectID": hit.get("objectID")
+                    }
+                })
+        
+        return results
+
+    except RateLimited:
+        raise
+    except Exception as e:
+        print(f"Error fetching from HN (Async): {e}")
+        return []
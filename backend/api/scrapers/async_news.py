@@ -1,10 +1,11 @@
-import httpx
 import os
 from dotenv import load_dotenv
+from api.scrapers.clients import get_http_client
+from api.scrapers.scheduler import RateLimited, parse_retry_after
 
 load_dotenv()
 
-async def fetch_from_newsapi(query, page_size=10):
+async def fetch_from_newsapi(query, limit=10):
     """
     Async fetch from NewsAPI.
     """
@@ -22,40 +23,46 @@ async def fetch_from_newsapi(query, page_size=10):
         "apiKey": api_key,
         "language": "en",
         "sortBy": "relevancy",
-        "pageSize": page_size,
+        "pageSize": limit,
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, params=params, timeout=5.0)
-            if response.status_code != 200:
-                print(f"NewsAPI failed: {response.status_code} - {response.text}")
-                return []
-            
-            data = response.json()
-            articles = data.get("articles", [])
-            results = []
+    # Shared keep-alive client (see api.scrapers.clients)
+    client = get_http_client()
+    try:
+        response = await client.get(url, params=params, timeout=5.0)
+        if response.status_code == 429:
+            raise RateLimited("news", parse_retry_after(response.headers.get("Retry-After")))
+        if response.status_code != 200:
+            print(f"NewsAPI failed: {response.status_code} - {response.text}")
+            return []
+        
+        data = response.json()
+        articles = data.get("articles", [])
+        results = []
 
-            for art in articles:
-                title = art.get("title")
-                description = art.get("description") or ""
-                url = art.get("url")
-                
-                if title:
-                    # Combine title + desc for better embeddings, but keep separate for display if needed
-                    text = f"{title}. {description}"
-                    results.append({
-                        "content": text,
-                        "source": "NewsAPI",
-                        "url": url,
-                        "meta": {
-                            "source_name": art.get("source", {}).get("name"),
-                            "publishedAt": art.get("publishedAt")
-                        }
-                    })
+        for art in articles:
+            title = art.get("title")
+            description = art.get("description") or ""
+            url = art.get("url")
             
-            return results
+            if title:
+                # Combine title + desc for better embeddings, but keep separate for display if needed
+                text = f"{title}. {description}"
+                results.append({
+                    "content": text,
+                    "source": "NewsAPI",
+                    "url": url,
+                    "meta": {
+                        "title": title,
+                        "source_name": art.get("source", {}).get("name"),
+                        "publishedAt": art.get("publishedAt")
+                    }
+                })
+        
+        return results
 
-        except Exception as e:
-            print(f"Error fetching from NewsAPI (Async): {e}")
-            return []
+    except RateLimited:
+        raise
+    except Exception as e:
+        print(f"Error fetching from NewsAPI (Async): {e}")
+        return []
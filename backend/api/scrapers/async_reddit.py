@@ -1,31 +1,21 @@
-import asyncpraw
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from asyncprawcore.exceptions import TooManyRequests
+from api.scrapers.clients import get_reddit
+from api.scrapers.scheduler import RateLimited, parse_retry_after
 
 async def fetch_from_reddit(query, limit=10):
     """
     Async fetch from Reddit using AsyncPRAW.
     """
-    client_id = os.getenv("REDDIT_CLIENT_ID")
-    client_secret = os.getenv("REDDIT_CLIENT_SECRET")
-    user_agent = os.getenv("REDDIT_USER_AGENT", "ThoughtNet/0.2 Async")
-
-    if not client_id or not client_secret:
-        print("Warning: Reddit credentials not found.")
+    if not query:
         return []
 
-    if not query:
+    # Cached session (see api.scrapers.clients): no new OAuth round-trip per call
+    reddit = await get_reddit()
+    if reddit is None:
+        print("Warning: Reddit credentials not found.")
         return []
 
     try:
-        reddit = asyncpraw.Reddit(
-            client_id=client_id,
-            client_secret=client_secret,
-            user_agent=user_agent
-        )
-        
         results = []
         subreddit = await reddit.subreddit("all")
         
@@ -42,14 +32,16 @@ async def fetch_from_reddit(query, limit=10):
                 "source": "Reddit",
                 "url": permalink, # Prefer comment thread link over direct link for "Discussion" context
                 "meta": {
+                    "title": title,
                     "score": submission.score,
                     "subreddit": submission.subreddit.display_name
                 }
             })
         
-        await reddit.close()
         return results
 
+    except TooManyRequests as e:
+        raise RateLimited("reddit", parse_retry_after(e.response.headers.get("retry-after")))
     except Exception as e:
         print(f"Error fetching from Reddit (Async): {e}")
         return []
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import os
+import time
+
+from api.scrapers.scheduler import fetch_started
+from api.utils.ttl_cache import TTLCache
+
+# Seconds a scraper response counts as fresh (sources set their own TTL
+# in api.scrapers.registry)
+DEFAULT_TTL = 600
+
+# After the TTL an entry is still served for this long while it is
+# refreshed in the background (stale-while-revalidate)
+STALE_TTL = int(os.getenv("THOUGHTNET_SCRAPER_STALE_TTL", "3600"))
+
+LOCAL_CACHE_SIZE = int(os.getenv("THOUGHTNET_SCRAPER_CACHE_SIZE", "2048"))
+
+_local = TTLCache(maxsize=LOCAL_CACHE_SIZE)
+_refreshing = {}  # cache key -> background refresh task
+_inflight = {}  # cache key -> (fetch-and-store task, started event) of a miss
+
+
+def _shared_cache():
+    """
+    Optional cross-process backend: the Django cache alias named by
+    settings.THOUGHTNET_SCRAPER_CACHE (see CACHES in backend/settings.py).
+    """
+    try:
+        from django.conf import settings
+        from django.core.cache import caches
+    except ImportError:
+        return None
+
+    try:
+        if not settings.configured:
+            return None
+        alias = getattr(settings, "THOUGHTNET_SCRAPER_CACHE", None)
+        return caches[alias] if alias else None
+    except Exception as e:
+        print(f"[ScraperCache] Shared cache unavailable: {e}")
+        return None
+
+
+def cache_key(source, query, limit):
+    normalized = " ".join(query.lower().split())
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    return f"thoughtnet:scrape:{source}:{limit}:{digest}"
+
+
+async def _fetch_and_store(key, fetch_func, query, limit, ttl):
+    results = await fetch_func(query, limit=limit)
+    # Scrapers return [] on errors; don't pin a failure for a whole TTL
+    if results:
+        stored_at = time.time()
+        _local.set(key, results, stored_at=stored_at)
+        shared = _shared_cache()
+        if shared is not None:
+            try:
+                await shared.aset(key, (results, stored_at), timeout=ttl + STALE_TTL)
+            except Exception as e:
+                print(f"[ScraperCache] Shared cache write failed: {e}")
+    return results
+
+
+def _refresh_in_background(key, source, fetch_func, query, limit, ttl):
+    task = _refreshing.get(key)
+    if task is not None and not task.done():
+        return
+
+    async def _refresh():
+        try:
+            await _fetch_and_store(key, fetch_func, query, limit, ttl)
+        except Exception as e:
+            print(f"[ScraperCache] Background refresh failed for {source}: {e}")
+        finally:
+            _refreshing.pop(key, None)
+
+    _refreshing[key] = asyncio.get_running_loop().create_task(_refresh())
+
+
+def _start_fetch(key, fetch_func, query, limit, ttl):
+    """
+    The fetch-and-store task of a miss; concurrent misses of one key share it.
+    """
+    loop = asyncio.get_running_loop()
+    inflight = _inflight.get(key)
+    if inflight is not None and not inflight[0].done() and inflight[0].get_loop() is loop:
+        return inflight
+
+    started = asyncio.Event()
+    # The task copies the context, so the limiter inside it sees the event
+    token = fetch_started.set(started)
+    try:
+        task = loop.create_task(_fetch_and_store(key, fetch_func, query, limit, ttl))
+    finally:
+        fetch_started.reset(token)
+
+    def _done(t):
+        if _inflight.get(key, (None,))[0] is t:
+            del _inflight[key]
+        # Nobody may be waiting any more (deadline passed); the callers
+        # still waiting report the error themselves
+        if not t.cancelled():
+            t.exception()
+
+    task.add_done_callback(_done)
+    _inflight[key] = (task, started)
+    return task, started
+
+
+async def _await_fetch(task, started, deadline):
+    # Shielded: a caller giving up (deadline, fetch budget) only drops the
+    # result from its own response, the fetch still fills the cache
+    if deadline is None:
+        return await asyncio.shield(task)
+    # The deadline starts once the scheduler has let the request out
+    waiter = asyncio.ensure_future(started.wait())
+    try:
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+    return await asyncio.wait_for(asyncio.shield(task), timeout=deadline)
+
+
+async def cached_fetch(source, fetch_func, query, limit=10, ttl=DEFAULT_TTL, deadline=None):
+    """
+    `fetch_func(query, limit=limit)` behind a TTL cache.
+
+    Fresh hits (younger than `ttl`) return immediately; stale hits (within
+    STALE_TTL past the TTL) also return immediately and schedule a refresh; misses
+    fetch inline. Lookups go to the in-process LRU first, then to the
+    shared Django cache if one is configured.
+
+    A miss waits at most `deadline` seconds (asyncio.TimeoutError after
+    that), counted from when the fetch leaves the source's scheduler queue
+    (see scheduler.mark_started). A fetch that completes after the caller
+    gave up is still cached.
+    """
+    key = cache_key(source, query, limit)
+
+    entry = _local.get(key)
+    if entry is None:
+        shared = _shared_cache()
+        if shared is not None:
+            try:
+                stored = await shared.aget(key)
+            except Exception as e:
+                print(f"[ScraperCache] Shared cache read failed: {e}")
+                stored = None
+            if stored is not None:
+                results, stored_at = stored
+                _local.set(key, results, stored_at=stored_at)
+                entry = (results, time.time() - stored_at)
+
+    if entry is not None:
+        results, age = entry
+        if age < ttl:
+            return results
+        if age < ttl + STALE_TTL:
+            _refresh_in_background(key, source, fetch_func, query, limit, ttl)
+            return results
+
+    task, started = _start_fetch(key, fetch_func, query, limit, ttl)
+    return await _await_fetch(task, started, deadline)
@@ -0,0 +1,95 @@
+import asyncio
+import importlib.util
+import os
+import weakref
+
+import asyncpraw
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection pool shared by every httpx-based scraper
+HTTP_MAX_CONNECTIONS = int(os.getenv("THOUGHTNET_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("THOUGHTNET_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("THOUGHTNET_HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class _LoopClients:
+    def __init__(self):
+        self.http = None
+        self.reddit = None
+        self.reddit_lock = asyncio.Lock()
+
+
+# Clients are tied to the event loop they were created on, so keep one set
+# per loop: the ASGI server's loop in production, throwaway loops in
+# scripts and async_to_sync callers.
+_registry = weakref.WeakKeyDictionary()
+
+
+def _loop_clients():
+    loop = asyncio.get_running_loop()
+    clients = _registry.get(loop)
+    if clients is None:
+        clients = _registry[loop] = _LoopClients()
+    return clients
+
+
+def get_http_client():
+    """
+    Application-scoped httpx client with a keep-alive pool, so repeated
+    sub-query fetches reuse connections instead of new TLS handshakes.
+    """
+    clients = _loop_clients()
+    if clients.http is None or clients.http.is_closed:
+        clients.http = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(5.0),
+            headers={"User-Agent": "ThoughtNet/0.2"},
+        )
+    return clients.http
+
+
+async def get_reddit():
+    """
+    Cached asyncpraw session: the OAuth token and HTTP session are reused
+    across sub-queries and requests. Returns None without credentials.
+    """
+    client_id = os.getenv("REDDIT_CLIENT_ID")
+    client_secret = os.getenv("REDDIT_CLIENT_SECRET")
+    user_agent = os.getenv("REDDIT_USER_AGENT", "ThoughtNet/0.2 Async")
+
+    if not client_id or not client_secret:
+        return None
+
+    clients = _loop_clients()
+    async with clients.reddit_lock:
+        if clients.reddit is None:
+            clients.reddit = asyncpraw.Reddit(
+                client_id=client_id,
+                client_secret=client_secret,
+                user_agent=user_agent
+            )
+    return clients.reddit
+
+
+async def aclose_clients():
+    """
+    Close the clients of the running loop (call before the loop goes away).
+    """
+    clients = _registry.pop(asyncio.get_running_loop(), None)
+    if clients is None:
+        return
+    if clients.http is not None:
+        await clients.http.aclose()
+    if clients.reddit is not None:
+        await clients.reddit.close()
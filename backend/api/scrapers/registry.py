@@ -0,0 +1,178 @@
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+from api.scrapers import replay
+from api.scrapers.scheduler import scheduled
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    """
+    Everything the pipeline needs to know about one source.
+
+    `fetch` is `async fetch(query, limit=10) -> [item]`, where every item has
+    the fields in `schema`. Rate limits feed the scheduler, `ttl` the
+    scraper cache and `deadline` the fetch fan-out.
+    """
+    name: str
+    label: str
+    fetch: Callable
+    aliases: tuple = ()
+    concurrency: int = 4
+    rate: float = 2.0       # sustained requests / second
+    burst: int = 4
+    ttl: int = 600          # seconds a response stays fresh
+    deadline: float = 5.0   # seconds for one (sub-query, source) fetch
+    schema: tuple = ("content", "source", "url", "meta")
+    # Legacy sync fetcher for api.pipeline (returns plain strings)
+    sync_fetch: Optional[Callable] = field(default=None, compare=False)
+
+
+_sources = {}
+_aliases = {}
+_fetchers = {}
+
+
+def register_source(spec):
+    _sources[spec.name] = spec
+    for alias in (spec.name, *spec.aliases):
+        _aliases[alias] = spec.name
+    _fetchers.pop(spec.name, None)
+    return spec
+
+
+def canonical_name(name):
+    return _aliases.get(name, name)
+
+
+def registered_sources():
+    return list(_sources.values())
+
+
+def resolve_sources(names):
+    """
+    Specs for the requested source names/aliases, deduplicated, in
+    registration order. Unknown names are ignored.
+    """
+    wanted = {canonical_name(n) for n in names}
+    unknown = wanted - _sources.keys()
+    if unknown:
+        print(f"[Registry] Ignoring unknown sources: {sorted(unknown)}")
+    return [spec for name, spec in _sources.items() if name in wanted]
+
+
+def validate_items(spec, items):
+    """
+    Drops the items that lack one of the `spec.schema` fields (or whose
+    content isn't text): a broken scraper or an old fixture shouldn't reach
+    dedupe and embedding as KeyErrors.
+    """
+    valid = [
+        it for it in items
+        if isinstance(it, dict) and all(f in it for f in spec.schema) and isinstance(it["content"], str)
+    ]
+    if len(valid) < len(items):
+        print(f"[Registry] {spec.name}: dropped {len(items) - len(valid)} item(s) not matching {spec.schema}")
+    return valid
+
+
+def _validated(spec, fetch_func):
+    async def _fetch(query, limit=10):
+        return validate_items(spec, await fetch_func(query, limit=limit))
+
+    return _fetch
+
+
+def get_fetcher(spec):
+    """
+    The fetcher the pipeline actually calls for `spec`, according to
+    THOUGHTNET_SCRAPER_MODE: live or recording fetches go through the
+    source's rate limiter; replays are served from disk without it.
+    Either way items are checked against `spec.schema` (before recording).
+    """
+    fetcher = _fetchers.get(spec.name)
+    if fetcher is None:
+        if replay.SCRAPER_MODE == "replay":
+            fetcher = _validated(spec, replay.replaying(spec.name))
+        else:
+            fetcher = _validated(spec, spec.fetch)
+            if replay.SCRAPER_MODE == "record":
+                fetcher = replay.recording(spec.name, fetcher)
+            fetcher = scheduled(spec.name, fetcher, concurrency=spec.concurrency,
+                                rate=spec.rate, burst=spec.burst)
+        _fetchers[spec.name] = fetcher
+    return fetcher
+
+
+def set_scraper_mode(mode, fixture_dir=None):
+    """
+    Switch between live / record / replay at runtime (benchmarks, tests).
+    """
+    if mode not in ("live", "record", "replay"):
+        raise ValueError(f"Unsupported scraper mode: {mode}")
+    replay.SCRAPER_MODE = mode
+    if fixture_dir is not None:
+        replay.FIXTURE_DIR = Path(fixture_dir)
+    _fetchers.clear()
+
+
+def _env(name, default):
+    return type(default)(os.getenv(name, default))
+
+
+# Legacy sync fetchers, imported on use so the async path never loads praw/requests
+def _legacy_reddit(query, limit):
+    from api.utils.reddit_scraper import fetch_from_reddit
+    return fetch_from_reddit(query, limit=limit)
+
+
+def _legacy_news(query, limit):
+    from api.utils.news_scraper import fetch_from_newsapi
+    return fetch_from_newsapi(query, page_size=limit)
+
+
+def _legacy_hn(query, limit):
+    # HN search might not support complex queries well: legacy path lists top stories
+    from api.utils.hackernews import fetch_from_hackernews
+    return fetch_from_hackernews(limit=limit)
+
+
+# Built-in sources. Limits follow each provider's published quota.
+def _register_builtin_sources():
+    from api.scrapers.async_reddit import fetch_from_reddit
+    from api.scrapers.async_news import fetch_from_newsapi
+    from api.scrapers.async_hn import fetch_from_hackernews
+    from api.scrapers.async_ddg import fetch_from_duckduckgo
+
+    register_source(SourceSpec(
+        name="reddit", label="Reddit", fetch=fetch_from_reddit,
+        concurrency=4, rate=1.5, burst=6,  # OAuth: 100 req/min
+        ttl=_env("THOUGHTNET_TTL_REDDIT", 600),
+        deadline=_env("THOUGHTNET_DEADLINE_REDDIT", 6.0),
+        sync_fetch=_legacy_reddit,
+    ))
+    register_source(SourceSpec(
+        name="news", label="NewsAPI", fetch=fetch_from_newsapi,
+        concurrency=2, rate=1.0, burst=4,
+        ttl=_env("THOUGHTNET_TTL_NEWS", 1800),
+        deadline=_env("THOUGHTNET_DEADLINE_NEWS", 5.0),
+        sync_fetch=_legacy_news,
+    ))
+    register_source(SourceSpec(
+        name="hn", label="HN", fetch=fetch_from_hackernews,
+        concurrency=8, rate=2.5, burst=10,  # Algolia: 10k req/hour/IP
+        ttl=_env("THOUGHTNET_TTL_HN", 600),
+        deadline=_env("THOUGHTNET_DEADLINE_HN", 5.0),
+        sync_fetch=_legacy_hn,
+    ))
+    register_source(SourceSpec(
+        name="ddg", label="DuckDuckGo", fetch=fetch_from_duckduckgo, aliases=("web",),
+        concurrency=2, rate=0.5, burst=2,  # no official quota, bans quickly
+        ttl=_env("THOUGHTNET_TTL_DDG", 3600),
+        deadline=_env("THOUGHTNET_DEADLINE_DDG", 6.0),
+    ))
+
+
+_register_builtin_sources()
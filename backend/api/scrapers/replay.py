@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from pathlib import Path
+
+from api.scrapers.scheduler import mark_started
+
+# Scraper backend:
+#   "live"   - call the real providers
+#   "record" - call the real providers and save every response to FIXTURE_DIR
+#   "replay" - serve saved responses from FIXTURE_DIR, no network at all
+SCRAPER_MODE = os.getenv("THOUGHTNET_SCRAPER_MODE", "live")
+FIXTURE_DIR = Path(os.getenv(
+    "THOUGHTNET_FIXTURE_DIR",
+    str(Path(__file__).resolve().parents[2] / "fixtures" / "scrapers"),
+))
+
+# Synthetic latency for replayed responses, so offline load tests still
+# exercise deadlines and concurrency. Jitter is seeded by the request, so
+# the same request always gets the same delay.
+REPLAY_LATENCY_MS = float(os.getenv("THOUGHTNET_REPLAY_LATENCY_MS", "0"))
+REPLAY_JITTER_MS = float(os.getenv("THOUGHTNET_REPLAY_JITTER_MS", "0"))
+
+
+def fixture_path(source, query, limit):
+    normalized = " ".join(query.lower().split())
+    digest = hashlib.sha1(f"{normalized}|{limit}".encode("utf-8")).hexdigest()[:16]
+    return FIXTURE_DIR / source / f"{digest}.json"
+
+
+def save_fixture(source, query, limit, results):
+    path = fixture_path(source, query, limit)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({
+        "source": source,
+        "query": query,
+        "limit": limit,
+        "results": results,
+    }, indent=1, sort_keys=True))
+    os.replace(tmp, path)
+
+
+def load_fixture(source, query, limit):
+    path = fixture_path(source, query, limit)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())["results"]
+
+
+def replay_delay(source, query, limit, latency_ms=None, jitter_ms=None):
+    latency_ms = REPLAY_LATENCY_MS if latency_ms is None else latency_ms
+    jitter_ms = REPLAY_JITTER_MS if jitter_ms is None else jitter_ms
+    rng = random.Random(f"{source}|{query}|{limit}")
+    return max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000.0
+
+
+def recording(source, fetch_func):
+    """
+    Wraps a live fetcher so every non-empty response is also written to disk.
+    """
+    async def _fetch(query, limit=10):
+        results = await fetch_func(query, limit=limit)
+        if results:
+            await asyncio.to_thread(save_fixture, source, query, limit, results)
+        return results
+
+    return _fetch
+
+
+def replaying(source):
+    """
+    Fetcher that serves recorded responses (after the synthetic latency).
+    Unrecorded requests return [] like a provider with no hits.
+    """
+    async def _fetch(query, limit=10):
+        # No limiter in replay: the synthetic latency is the request itself
+        mark_started()
+        delay = replay_delay(source, query, limit)
+        if delay:
+            await asyncio.sleep(delay)
+        results = load_fixture(source, query, limit)
+        if results is None:
+            print(f"[Replay] No fixture for {source} '{query}' (limit={limit})")
+            return []
+        return results
+
+    return _fetch
@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import email.utils
+import os
+import random
+import threading
+import time
+import weakref
+
+
+class RateLimited(Exception):
+    """
+    Raised by a scraper when the provider answers 429 / "rate limited", so
+    the scheduler can back off instead of the call silently returning [].
+    """
+
+    def __init__(self, source, retry_after=None):
+        super().__init__(f"{source} rate limited (retry after {retry_after}s)")
+        self.source = source
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """
+    Retry-After header -> seconds (it may be a delay or an HTTP date).
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Limits for sources that don't declare their own (see api.scrapers.registry):
+#   concurrency - requests in flight at once
+#   rate        - sustained requests per second (token refill rate)
+#   burst       - bucket size, i.e. how many requests may go out back to back
+DEFAULT_LIMITS = {"concurrency": 4, "rate": 2.0, "burst": 4}
+
+MAX_RETRIES = int(os.getenv("THOUGHTNET_SCRAPER_RETRIES", "2"))
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+
+
+# Set by the scraper cache around a fetch (see cached_fetch): the limiter
+# sets the event once the request actually goes out, so a source's deadline
+# doesn't count the time spent queued for a token or a slot
+fetch_started = contextvars.ContextVar("fetch_started", default=None)
+
+
+def mark_started():
+    event = fetch_started.get()
+    if event is not None:
+        event.set()
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """
+        Takes a token if one is available; otherwise returns how long to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        # Provider told us to back off: nobody gets a token until then
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class SourceLimiter:
+    """
+    Concurrency cap + token bucket + Retry-After aware backoff for one source.
+    """
+
+    def __init__(self, source, concurrency, rate, burst):
+        self.source = source
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        # asyncio.Semaphore binds to the loop it is first used on
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            sem = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        return sem
+
+    async def run(self, fetch_func, query, limit):
+        for attempt in range(MAX_RETRIES + 1):
+            await self.bucket.acquire()
+            async with self._semaphore():
+                mark_started()
+                try:
+                    return await fetch_func(query, limit=limit)
+                except RateLimited as e:
+                    delay = e.retry_after
+                    if delay is None:
+                        delay = BASE_BACKOFF * (2 ** attempt) * (1 + random.random())
+                    delay = min(delay, MAX_BACKOFF)
+                    self.bucket.pause(delay)
+                    print(f"[Scheduler] {self.source} rate limited, backing off {delay:.1f}s "
+                          f"(attempt {attempt + 1}/{MAX_RETRIES + 1})")
+
+        print(f"[Scheduler] {self.source} still rate limited, giving up on '{query}'")
+        return []
+
+
+_limiters = {}
+
+
+def get_limiter(source, **limits):
+    limiter = _limiters.get(source)
+    if limiter is None:
+        limiter = _limiters[source] = SourceLimiter(source, **{**DEFAULT_LIMITS, **limits})
+    return limiter
+
+
+def scheduled(source, fetch_func, **limits):
+    """
+    Wraps a scraper so every call goes through the source's limiter.
+    """
+    limiter = get_limiter(source, **limits)
+
+    async def _fetch(query, limit=10):
+        return await limiter.run(fetch_func, query, limit)
+
+    _fetch.__name__ = getattr(fetch_func, "__name__", "fetch")
+    return _fetch
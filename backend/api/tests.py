@@ -1,3 +1,112 @@
-from django.test import TestCase
+import importlib.util
+import unittest
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from api.benchmarks import PARITY_TOLERANCE, embedding_parity
+from api.utils.near_duplicates import headline, near_duplicate_groups
+
+HAS_SENTENCE_TRANSFORMERS = importlib.util.find_spec("sentence_transformers") is not None
+HAS_OPTIMUM = importlib.util.find_spec("optimum") is not None
+
+PARITY_TEXTS = [
+    "Is AGI coming within the next decade?",
+    "OpenAI releases a new reasoning model",
+    "Rust vs Go for backend services in 2024",
+    "Why are GPU prices still so high?",
+    "Show HN: I built a static site generator in a weekend",
+    "The Fed holds interest rates steady amid inflation worries",
+    "How do I get started with machine learning?",
+    "Climate change is accelerating faster than predicted",
+    "SQLite is all you need for most web apps",
+    "Remote work is here to stay, survey finds",
+]
+
+
+@unittest.skipUnless(HAS_SENTENCE_TRANSFORMERS, "sentence-transformers not installed")
+class EmbeddingBackendParityTests(SimpleTestCase):
+    """
+    The faster embedding backends have to stay close to fp32 torch, the
+    vectors the relevance threshold and the cache were tuned on.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from api.utils.embeddings import get_model
+
+        try:
+            get_model("torch")
+        except OSError as e:
+            # No network and nothing in the Hugging Face cache (clean CI runner)
+            raise unittest.SkipTest(f"embedding model not available locally: {e}")
+
+    def assertParity(self, backend):
+        result = embedding_parity(backend, PARITY_TEXTS)
+        self.assertGreaterEqual(result["min_cos"], PARITY_TOLERANCE, result)
+
+    def test_torch_int8_matches_fp32(self):
+        self.assertParity("torch-int8")
+
+    @unittest.skipUnless(HAS_OPTIMUM, "optimum[onnxruntime] not installed")
+    def test_onnx_matches_fp32(self):
+        from api.utils.embeddings import loaded_backend
+
+        # Without ONNX Runtime the onnx backend quietly serves torch
+        self.assertEqual(loaded_backend("onnx"), "onnx")
+        self.assertParity("onnx")
+
+
+def news_item(title, description, url, outlet):
+    # Shaped like async_news.fetch_from_news
+    return {
+        "content": f"{title}. {description}",
+        "source": "NewsAPI",
+        "url": url,
+        "meta": {"title": title, "source_name": outlet, "publishedAt": "2025-06-02T14:00:00Z"},
+    }
+
+
+def ddg_item(title, body, url):
+    # Shaped like async_ddg.fetch_from_ddg
+    return {
+        "content": f"{title}: {body}",
+        "source": "Web Search (DDG)",
+        "url": url,
+        "meta": {"title": title, "source_name": "DuckDuckGo"},
+    }
+
+
+class NearDuplicateTests(SimpleTestCase):
+    def groups(self, items):
+        return near_duplicate_groups([headline(it) for it in items])
+
+    def test_syndicated_headline_with_different_descriptions(self):
+        items = [
+            news_item("OpenAI unveils GPT-5 with improved reasoning - Reuters",
+                      "The San Francisco company said the model makes fewer factual errors.",
+                      "https://www.reuters.com/technology/openai-gpt5", "Reuters"),
+            news_item("OpenAI unveils GPT-5 with improved reasoning | The Verge",
+                      "Sam Altman calls it a significant step on the path to AGI.",
+                      "https://www.theverge.com/ai/openai-gpt5", "The Verge"),
+            ddg_item("OpenAI unveils GPT-5 with improved reasoning",
+                     "OpenAI on Thursday released GPT-5, its newest flagship model, to all ChatGPT users...",
+                     "https://example.com/gpt5"),
+            news_item("Nvidia shares slide as export curbs widen - Bloomberg",
+                      "Chipmaker warns of a hit to data center revenue.",
+                      "https://www.bloomberg.com/nvidia", "Bloomberg"),
+        ]
+        self.assertEqual(self.groups(items), [[0, 1, 2], [3]])
+
+    def test_different_stories_stay_apart(self):
+        items = [
+            ddg_item("Rust vs Go for backend services", "A comparison of performance and tooling.",
+                     "https://example.com/rust-go"),
+            ddg_item("Rust 1.80 released", "Rust 1.80 stabilises LazyCell and LazyLock.",
+                     "https://blog.rust-lang.org/rust-1.80"),
+        ]
+        self.assertEqual(self.groups(items), [[0], [1]])
+
+    def test_texts_without_words_are_not_merged(self):
+        self.assertEqual(near_duplicate_groups(["\U0001F525\U0001F525", "...", "", "\U0001F680"]),
+                         [[0], [1], [2], [3]])
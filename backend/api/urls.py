@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import thoughtnet_pipeline_view, WarmupPing
+from .views import thoughtnet_pipeline_view, thoughtnet_stream_view, metrics_view, WarmupPing
 
 urlpatterns = [
     path("cluster/", thoughtnet_pipeline_view, name="cluster"),
+    path("cluster/stream/", thoughtnet_stream_view, name="cluster-stream"),
+    path("metrics/", metrics_view, name="metrics"),
     path("warmup/", WarmupPing.as_view(), name="warmup-ping"),
 ]
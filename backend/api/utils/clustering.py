@@ -1,21 +1,84 @@
-from sklearn.cluster import KMeans, AgglomerativeClustering, DBSCAN, SpectralClustering, MeanShift
-from hdbscan import HDBSCAN
+import os
+
+from sklearn.cluster import KMeans, MiniBatchKMeans, AgglomerativeClustering, DBSCAN, SpectralClustering, MeanShift
 from sklearn.metrics import silhouette_score, davies_bouldin_score, calinski_harabasz_score
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
-def evaluate_clusters(embeddings, labels):
-    # Convert numpy array → list
-    if isinstance(labels, np.ndarray):
-        labels = labels.tolist()
+# Auto-k: largest k tried, points the silhouette estimate is computed on, and
+# the corpus size from which the scan switches to MiniBatchKMeans
+AUTO_K_MAX = int(os.getenv("THOUGHTNET_AUTO_K_MAX", "8"))
+SILHOUETTE_SAMPLE = int(os.getenv("THOUGHTNET_SILHOUETTE_SAMPLE", "1000"))
+MINIBATCH_THRESHOLD = int(os.getenv("THOUGHTNET_MINIBATCH_THRESHOLD", "5000"))
+
+# Working-memory ceiling for one clustering call; a method whose estimate
+# (see estimate_memory) is above it is swapped for its scalable variant
+CLUSTER_MEMORY_MB = float(os.getenv("THOUGHTNET_CLUSTER_MEMORY_MB", "1024"))
+# Neighbours per point in the sparse kNN graphs
+KNN_NEIGHBORS = int(os.getenv("THOUGHTNET_KNN_NEIGHBORS", "15"))
+# hdbscan_approx projects down to this many dimensions first: space-partitioning
+# trees are useless at 384 dims but fast at a few dozen
+HDBSCAN_APPROX_DIMS = int(os.getenv("THOUGHTNET_HDBSCAN_APPROX_DIMS", "32"))
+
+# Peak working memory in bytes for n points of dimension d (float32 input,
+# k clusters, g = KNN_NEIGHBORS). The quadratic methods are fine for one
+# sub-query's few dozen items; past a few thousand use the scalable variants.
+#   kmeans              n*d*4 + n*k*8                   (distances in chunks)
+#   minibatch_kmeans    n*d*4 + 1024*k*8                (one batch at a time)
+#   hdbscan             n*n*8                           (library default may pick a dense mutual-reachability matrix)
+#   hdbscan_approx      n*(32*8 + g*16)                 (PCA + boruvka kd-tree, approximate MST)
+#   agglomerative       n*n*4                           (condensed ward distances, float64)
+#   agglomerative_knn   n*d*4 + n*g*48                  (ward restricted to a kNN connectivity graph)
+#   dbscan              n*n*8                           (eps=1.2 on unit vectors: nearly everyone is a neighbour)
+#   spectral            n*n*12                          (dense affinity + clipped copy + laplacian)
+#   spectral_knn        n*d*4 + n*g*48 + n*k*8          (sparse symmetric kNN affinity, arpack)
+#   meanshift           n*n*5                           (bandwidth estimate keeps a 0.3n neighbour list per point)
+#   meanshift_sampled   n*d*4 + 500*500*16              (bandwidth and seeds from 500 sampled points)
+MEMORY_CEILING = {
+    "kmeans": lambda n, d, k, g: n * d * 4 + n * k * 8,
+    "minibatch_kmeans": lambda n, d, k, g: n * d * 4 + 1024 * k * 8,
+    "hdbscan": lambda n, d, k, g: n * n * 8,
+    "hdbscan_approx": lambda n, d, k, g: n * (HDBSCAN_APPROX_DIMS * 8 + g * 16),
+    "agglomerative": lambda n, d, k, g: n * n * 4,
+    "agglomerative_knn": lambda n, d, k, g: n * d * 4 + n * g * 48,
+    "dbscan": lambda n, d, k, g: n * n * 8,
+    "spectral": lambda n, d, k, g: n * n * 12,
+    "spectral_knn": lambda n, d, k, g: n * d * 4 + n * g * 48 + n * k * 8,
+    "meanshift": lambda n, d, k, g: n * n * 5,
+    "meanshift_sampled": lambda n, d, k, g: n * d * 4 + 500 * 500 * 16,
+}
+
+# Memory-bounded stand-in for each quadratic method (kmeans is linear already)
+SCALABLE_VARIANT = {
+    "hdbscan": "hdbscan_approx",
+    "agglomerative": "agglomerative_knn",
+    "dbscan": "hdbscan_approx",
+    "spectral": "spectral_knn",
+    "meanshift": "meanshift_sampled",
+}
+
+
+def as_embedding_matrix(embeddings):
+    """
+    Contiguous float32 view of `embeddings` (no copy if it already is one).
+    """
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
 
-    # Ensure labels are flat (int list)
-    if labels and isinstance(labels[0], (list, tuple)):
-        labels = [lbl[0] for lbl in labels]
+
+def evaluate_clusters(embeddings, labels, sample_size=None):
+    """
+    Silhouette, Davies-Bouldin and Calinski-Harabasz scores. Silhouette is
+    O(n^2); with `sample_size` it's estimated on that many (seeded) points.
+    """
+    embeddings = as_embedding_matrix(embeddings)
+    labels = np.asarray(labels)
+
+    # Ensure labels are flat (one int per sample)
+    if labels.ndim > 1:
+        labels = labels[:, 0]
 
     # Handle empty, single cluster, or all-unique cluster cases (n_clusters >= n_samples)
-    unique_labels = set(labels)
-    if not labels or len(unique_labels) <= 1 or len(unique_labels) >= len(embeddings):
+    n_unique = len(np.unique(labels))
+    if not len(labels) or n_unique <= 1 or n_unique >= len(embeddings):
         return {
             "silhouette": None,
             "davies_bouldin": None,
@@ -23,22 +86,132 @@ def evaluate_clusters(embeddings, labels):
         }
 
     return {
-        "silhouette": float(silhouette_score(embeddings, labels)),
+        "silhouette": float(silhouette_score(
+            embeddings, labels,
+            sample_size=sample_size if sample_size and sample_size < len(labels) else None,
+            random_state=42,
+        )),
         "davies_bouldin": float(davies_bouldin_score(embeddings, labels)),
         "calinski_harabasz": float(calinski_harabasz_score(embeddings, labels)),
     }
 
 
-def cluster_embeddings(embeddings, method="kmeans", **kwargs):
-    if not embeddings:
-        return [], None
+def _farthest_point(embeddings, centers, labels):
+    # The point worst served by its centre seeds the next one (a greedy
+    # k-means++ step), so k+1 starts from the k solution
+    dist = np.einsum("ij,ij->i", embeddings - centers[labels], embeddings - centers[labels])
+    return embeddings[int(np.argmax(dist))]
+
+
+def auto_kmeans(embeddings, k_min=2, k_max=None, sample_size=None):
+    """
+    KMeans with k picked by the best silhouette in [k_min, k_max].
+
+    Every k is warm-started from the previous solution plus one new centre
+    (single init, a few Lloyd iterations) instead of a fresh fit, and the
+    silhouette is estimated on one fixed sample of points, so the scan costs
+    about one ordinary fit plus O(sample^2) per k. Large corpora use
+    MiniBatchKMeans. Returns `(labels, k, {k: silhouette})`.
+    """
+    n = len(embeddings)
+    k_max = min(AUTO_K_MAX if k_max is None else k_max, n - 1)
+    if k_max < k_min:
+        # Too few points to compare k values
+        k = max(1, min(k_min, n))
+        return KMeans(n_clusters=k, random_state=42).fit_predict(embeddings), k, {}
+
+    sample_size = SILHOUETTE_SAMPLE if sample_size is None else sample_size
+    rng = np.random.default_rng(42)
+    sample = rng.choice(n, size=sample_size, replace=False) if n > sample_size else np.arange(n)
+
+    def fit(k, init):
+        if n >= MINIBATCH_THRESHOLD:
+            model = MiniBatchKMeans(n_clusters=k, init=init, n_init=1, batch_size=1024, random_state=42)
+        else:
+            model = KMeans(n_clusters=k, init=init, n_init=1, random_state=42)
+        return model.fit(embeddings)
+
+    model = fit(k_min, "k-means++")
+    best_labels, best_k, best_score = model.labels_, k_min, -np.inf
+    scores = {}
+    for k in range(k_min, k_max + 1):
+        if k > k_min:
+            init = np.vstack([model.cluster_centers_, _farthest_point(embeddings, model.cluster_centers_, model.labels_)])
+            model = fit(k, init)
+        labels = model.labels_
+        if len(np.unique(labels[sample])) < 2:
+            continue
+        scores[k] = float(silhouette_score(embeddings[sample], labels[sample]))
+        # Ties go to the smaller k
+        if scores[k] > best_score:
+            best_labels, best_k, best_score = labels, k, scores[k]
+
+    return best_labels, best_k, scores
+
+
+def estimate_memory(method, n, dim=384, n_clusters=8):
+    """
+    Rough peak working memory (bytes) of `method` on n points, per MEMORY_CEILING.
+    """
+    if method not in MEMORY_CEILING:
+        raise ValueError(f"Unsupported clustering method: {method}")
+    k = n_clusters if isinstance(n_clusters, int) else AUTO_K_MAX
+    return MEMORY_CEILING[method](n, dim, k, KNN_NEIGHBORS)
+
+
+def _knn_graph(embeddings, n_neighbors):
+    from sklearn.neighbors import kneighbors_graph
+
+    # Euclidean neighbours of unit vectors are the cosine neighbours
+    n_neighbors = min(n_neighbors, len(embeddings) - 1)
+    return kneighbors_graph(embeddings, n_neighbors=n_neighbors, include_self=False, n_jobs=-1)
+
+
+def cluster_embeddings(embeddings, method="kmeans", compute_metrics=False, **kwargs):
+    """
+    Clusters a (n, dim) embedding matrix and returns `(labels, metrics)`,
+    with `labels` as an int ndarray of length n.
+
+    Embeddings are expected to be L2-normalised (see embed_texts), so the
+    cosine similarity between rows is just their dot product.
+
+    kmeans takes `n_clusters="auto"` (with optional `k_min` / `k_max`) to
+    pick k itself, see auto_kmeans.
+
+    Methods whose memory estimate (MEMORY_CEILING) exceeds
+    THOUGHTNET_CLUSTER_MEMORY_MB run as their SCALABLE_VARIANT instead.
+
+    `metrics` always has "method", the method that actually ran (plus
+    "n_clusters" / "silhouette_by_k" for auto kmeans). The quality scores
+    (see evaluate_clusters) are only added with `compute_metrics=True`:
+    they cost far more than the clustering itself.
+    """
+    if len(embeddings) == 0:
+        return np.empty(0, dtype=np.int64), {"method": method}
+
+    embeddings = as_embedding_matrix(embeddings)
+
+    if method in SCALABLE_VARIANT:
+        need = estimate_memory(method, len(embeddings), embeddings.shape[1], kwargs.get("n_clusters", 8))
+        if need > CLUSTER_MEMORY_MB * 2**20:
+            print(f"[Clustering] {method} on {len(embeddings)} items needs ~{need / 2**20:.0f} MB, "
+                  f"using {SCALABLE_VARIANT[method]}")
+            method = SCALABLE_VARIANT[method]
+    extra = {"method": method}
 
     if method == "kmeans":
         n_clusters = kwargs.get("n_clusters", 3)
-        clusterer = KMeans(n_clusters=n_clusters, random_state=42)
-        labels = clusterer.fit_predict(embeddings)
+        if n_clusters == "auto":
+            labels, k, scores = auto_kmeans(embeddings, k_min=kwargs.get("k_min", 2), k_max=kwargs.get("k_max"))
+            extra.update(n_clusters=k, silhouette_by_k=scores)
+        else:
+            clusterer = KMeans(n_clusters=n_clusters, random_state=42)
+            labels = clusterer.fit_predict(embeddings)
 
     elif method == "hdbscan":
+        # Imported here: it's optional for the default kmeans path and slow to import
+        from hdbscan import HDBSCAN
+
         min_cluster_size = kwargs.get("min_cluster_size", 2)
         clusterer = HDBSCAN(min_cluster_size=min_cluster_size)
         labels = clusterer.fit_predict(embeddings)
@@ -56,7 +229,8 @@ def cluster_embeddings(embeddings, method="kmeans", **kwargs):
 
     elif method == "spectral":
         n_clusters = kwargs.get("n_clusters", 3)
-        sim_matrix = cosine_similarity(embeddings)
+        # Cosine similarity of unit vectors; affinities must be non-negative
+        sim_matrix = np.clip(embeddings @ embeddings.T, 0.0, None)
         clusterer = SpectralClustering(n_clusters=n_clusters, affinity="precomputed", random_state=42)
         labels = clusterer.fit_predict(sim_matrix)
 
@@ -64,9 +238,58 @@ def cluster_embeddings(embeddings, method="kmeans", **kwargs):
         clusterer = MeanShift()
         labels = clusterer.fit_predict(embeddings)
 
+    elif method == "minibatch_kmeans":
+        n_clusters = kwargs.get("n_clusters", 3)
+        clusterer = MiniBatchKMeans(n_clusters=n_clusters, batch_size=1024, n_init=3, random_state=42)
+        labels = clusterer.fit_predict(embeddings)
+
+    elif method == "hdbscan_approx":
+        from hdbscan import HDBSCAN
+        from sklearn.decomposition import PCA
+
+        min_cluster_size = kwargs.get("min_cluster_size", 2)
+        reduced = embeddings
+        if embeddings.shape[1] > HDBSCAN_APPROX_DIMS and len(embeddings) > HDBSCAN_APPROX_DIMS:
+            reduced = PCA(n_components=HDBSCAN_APPROX_DIMS, svd_solver="randomized", random_state=42).fit_transform(embeddings)
+        clusterer = HDBSCAN(
+            min_cluster_size=min_cluster_size,
+            min_samples=kwargs.get("min_samples"),
+            algorithm="boruvka_kdtree",
+            approx_min_span_tree=True,
+        )
+        labels = clusterer.fit_predict(reduced)
+
+    elif method == "agglomerative_knn":
+        n_clusters = kwargs.get("n_clusters", 3)
+        # Ward merges only along kNN edges: sparse, no n x n distance matrix
+        connectivity = _knn_graph(embeddings, kwargs.get("n_neighbors", KNN_NEIGHBORS))
+        clusterer = AgglomerativeClustering(n_clusters=n_clusters, connectivity=connectivity, linkage="ward")
+        labels = clusterer.fit_predict(embeddings)
+
+    elif method == "spectral_knn":
+        n_clusters = kwargs.get("n_clusters", 3)
+        # Symmetrised sparse kNN affinity instead of the dense similarity matrix
+        graph = _knn_graph(embeddings, kwargs.get("n_neighbors", KNN_NEIGHBORS))
+        affinity = 0.5 * (graph + graph.T)
+        clusterer = SpectralClustering(n_clusters=n_clusters, affinity="precomputed",
+                                       eigen_solver="arpack", assign_labels="cluster_qr", random_state=42)
+        labels = clusterer.fit_predict(affinity)
+
+    elif method == "meanshift_sampled":
+        from sklearn.cluster import estimate_bandwidth
+
+        # Bandwidth and seeds from a sample: neither is quadratic in n. (Grid
+        # bin seeding degenerates at 384 dims, every point lands in its own bin.)
+        rng = np.random.default_rng(42)
+        sample = rng.choice(len(embeddings), size=min(500, len(embeddings)), replace=False)
+        bandwidth = kwargs.get("bandwidth") or estimate_bandwidth(embeddings[sample], quantile=0.3)
+        clusterer = MeanShift(bandwidth=bandwidth or None, seeds=embeddings[sample], cluster_all=True)
+        labels = clusterer.fit_predict(embeddings)
+
     else:
         raise ValueError(f"Unsupported clustering method: {method}")
 
-    metrics = evaluate_clusters(embeddings, labels)
-    return labels.tolist(), metrics
-
+    metrics = extra
+    if compute_metrics:
+        metrics = {**evaluate_clusters(embeddings, labels, sample_size=SILHOUETTE_SAMPLE), **extra}
+    return np.asarray(labels, dtype=np.int64), metrics
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows: no cross-process lock, the digest re-check still applies
+    fcntl = None
+
+# One row per slot, stored next to the vectors. Free slots have used == 0,
+# which makes them the first candidates for eviction.
+_INDEX_DTYPE = np.dtype([("digest", "S40"), ("created", "f8"), ("used", "f8")])
+
+
+def normalize_text(text):
+    """
+    Canonical form used for the cache key: NFC, trimmed, single spaces.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_digest(text):
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest().encode("ascii")
+
+
+class EmbeddingStore:
+    """
+    On-disk embedding cache keyed by normalised-text hash.
+
+    Layout of `<path>/`:
+      meta.json    - namespace (model/backend), vector dim and capacity
+      vectors.f32  - memory-mapped float32 matrix, `capacity x dim`
+      index.bin    - memory-mapped slot table (digest, created, used)
+
+      .lock        - flock()ed by every process using the directory
+
+    The store is bounded to `capacity` vectors; when full, the least
+    recently used slots are reused. Entries older than `max_age` seconds are
+    treated as misses. Several processes (worker processes, ASGI workers)
+    can share a directory: initialisation and writes hold an exclusive
+    lock, reads a shared one. Each process keeps its own digest -> slot map
+    and falls back to the shared index for digests it doesn't know (written
+    by another worker after it opened the store); read() re-checks the slot digests after copying the vectors, so a
+    slot rewritten by another worker reads as a miss rather than the wrong
+    vector (also where flock() isn't available).
+    """
+
+    def __init__(self, path, namespace, dim, capacity=100_000, max_age=30 * 86400):
+        self.path = Path(path)
+        self.namespace = namespace
+        self.dim = dim
+        self.capacity = capacity
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.path / ".lock", "a+")
+        with self._locked(exclusive=True):
+            self._open()
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        # Threads of this process, then other processes
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _open(self):
+        meta_path = self.path / "meta.json"
+        meta = {"namespace": self.namespace, "dim": self.dim, "capacity": self.capacity}
+
+        fresh = True
+        if meta_path.exists():
+            try:
+                fresh = json.loads(meta_path.read_text()) != meta
+            except ValueError:
+                fresh = True
+
+        mode = "w+" if fresh else "r+"
+        if fresh:
+            # Different model/dim/capacity: old vectors are useless, start over
+            print(f"[EmbeddingStore] Initialising cache at {self.path}")
+
+        self.vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode=mode,
+                                 shape=(self.capacity, self.dim))
+        self.index = np.memmap(self.path / "index.bin", dtype=_INDEX_DTYPE, mode=mode,
+                               shape=(self.capacity,))
+        if fresh:
+            self.index[:] = np.zeros(self.capacity, dtype=_INDEX_DTYPE)
+            self.index.flush()
+            tmp = meta_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(meta))
+            os.replace(tmp, meta_path)
+
+        self._slots = {}
+        for slot in np.flatnonzero(self.index["used"] > 0):
+            self._slots[bytes(self.index["digest"][slot])] = int(slot)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def read(self, digests, out):
+        """
+        Copies the cached vector of every digest into the matching row of
+        `out` (the rows are copies, not views: a slot can be reused later).
+        Returns the positions that missed and have to be encoded.
+        """
+        now = time.time()
+        slots = np.full(len(digests), -1, dtype=np.int64)
+        with self._locked():
+            self._sync_slots(digests)
+            for i, d in enumerate(digests):
+                slot = self._slots.get(d)
+                if slot is None:
+                    continue
+                row = self.index[slot]
+                if row["digest"] != d or now - row["created"] > self.max_age:
+                    # Rewritten by another process, or expired
+                    del self._slots[d]
+                    continue
+                slots[i] = slot
+
+            hits = np.flatnonzero(slots >= 0)
+            if len(hits):
+                out[hits] = self.vectors[slots[hits]]
+                # A writer clears the digest before touching the vector: if
+                # it changed while we copied, the row is not to be trusted
+                current = self.index["digest"][slots[hits]]
+                stale = hits[current != np.array([digests[i] for i in hits], dtype="S40")]
+                slots[stale] = -1
+                self.index["used"][slots[slots >= 0]] = now
+        return np.flatnonzero(slots < 0)
+
+    def _sync_slots(self, digests):
+        """
+        Picks up the slots other processes wrote for `digests` since this
+        process opened the store (or last looked): one vectorised pass over
+        the shared index, only when something isn't in `_slots`.
+        """
+        unknown = [d for d in digests if d not in self._slots]
+        if not unknown:
+            return
+        stored = self.index["digest"]
+        for slot in np.flatnonzero(np.isin(stored, np.array(unknown, dtype="S40"))):
+            self._slots[bytes(stored[slot])] = int(slot)
+
+    def put(self, digests, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(digests):
+            return
+        now = time.time()
+        with self._locked(exclusive=True):
+            # Another worker may have stored some of them since our read
+            self._sync_slots(digests)
+            fresh = []
+            for i, d in enumerate(digests):
+                slot = self._slots.get(d)
+                if slot is not None and self.index["digest"][slot] == d:
+                    if now - self.index["created"][slot] <= self.max_age:
+                        continue
+                    # Expired: free the old slot, the vector goes in below
+                    self.index[slot] = (b"", 0.0, 0.0)
+                    del self._slots[d]
+                fresh.append(i)
+            if not fresh:
+                return
+            digests = [digests[i] for i in fresh]
+            vectors = vectors[fresh]
+
+            # Free slots (used == 0) sort first, then least recently used
+            n = min(len(digests), self.capacity)
+            victims = np.argpartition(self.index["used"], n - 1)[:n]
+            for slot in victims:
+                old = bytes(self.index["digest"][slot])
+                if self._slots.get(old) == slot:
+                    del self._slots[old]
+
+            for slot, d, vec in zip(victims, digests[-n:], vectors[-n:]):
+                # Invalidate first, write the vector, then publish the digest
+                self.index["digest"][slot] = b""
+                self.vectors[slot] = vec
+                self.index[slot] = (d, now, now)
+                self._slots[d] = int(slot)
+
+            self.vectors.flush()
+            self.index.flush()
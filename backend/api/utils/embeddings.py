@@ -1,8 +1,167 @@
-from sentence_transformers import SentenceTransformer
+import os
+import threading
+from pathlib import Path
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+import numpy as np
 
-def embed_texts(texts):
-    if not texts:
-        return []
-    return model.encode(texts).tolist()
+from api.utils.embedding_cache import EmbeddingStore, text_digest
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Persistent embedding cache (set THOUGHTNET_EMBED_CACHE=0 to disable)
+EMBED_CACHE_ENABLED = os.getenv("THOUGHTNET_EMBED_CACHE", "1") == "1"
+EMBED_CACHE_DIR = os.getenv(
+    "THOUGHTNET_EMBED_CACHE_DIR",
+    str(Path(__file__).resolve().parents[2] / ".cache" / "embeddings"),
+)
+EMBED_CACHE_SIZE = int(os.getenv("THOUGHTNET_EMBED_CACHE_SIZE", "100000"))
+EMBED_CACHE_MAX_AGE = float(os.getenv("THOUGHTNET_EMBED_CACHE_MAX_AGE_DAYS", "30")) * 86400
+
+# Sentences per model forward pass
+EMBED_BATCH_SIZE = int(os.getenv("THOUGHTNET_EMBED_BATCH_SIZE", "64"))
+
+# Inference backend for the sentence embedder (all CPU):
+#   "torch"      - full-precision PyTorch (the reference)
+#   "torch-int8" - PyTorch with the Linear layers dynamically quantised to int8
+#   "onnx"       - ONNX Runtime via sentence-transformers (needs optimum[onnxruntime]);
+#                  THOUGHTNET_EMBED_ONNX_FILE picks a pre-quantised export such
+#                  as onnx/model_qint8_avx2.onnx
+EMBED_BACKENDS = ("torch", "torch-int8", "onnx")
+EMBED_BACKEND = os.getenv("THOUGHTNET_EMBED_BACKEND", "torch")
+EMBED_ONNX_FILE = os.getenv("THOUGHTNET_EMBED_ONNX_FILE", "")
+
+# Loaded on first use (or by api.utils.warmup), not at import: importing the
+# pipeline shouldn't cost a torch import and a model load
+_models = {} # requested backend -> (model, backend actually loaded)
+_stores = {} # loaded backend -> EmbeddingStore or None
+_lock = threading.Lock()
+
+
+def resolve_backend(backend=None):
+    backend = (backend or EMBED_BACKEND).lower()
+    if backend not in EMBED_BACKENDS:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+    return backend
+
+
+def _load_model(backend):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        try:
+            kwargs = {"file_name": EMBED_ONNX_FILE} if EMBED_ONNX_FILE else {}
+            return SentenceTransformer(MODEL_NAME, device="cpu", backend="onnx", model_kwargs=kwargs), backend
+        except Exception as e:
+            print(f"Warning: ONNX embedder unavailable ({e}). Falling back to torch.")
+            return SentenceTransformer(MODEL_NAME), "torch"
+
+    model = SentenceTransformer(MODEL_NAME, device="cpu" if backend == "torch-int8" else None)
+    if backend == "torch-int8":
+        import torch
+
+        # Weights stored as int8, activations quantised on the fly; the
+        # attention/FFN matmuls are where the time goes on CPU
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model, backend
+
+
+def _get(backend=None):
+    backend = resolve_backend(backend)
+    if backend not in _models:
+        with _lock:
+            if backend not in _models:
+                _models[backend] = _load_model(backend)
+    return _models[backend]
+
+
+def get_model(backend=None):
+    return _get(backend)[0]
+
+
+def loaded_backend(backend=None):
+    """
+    The backend actually serving `backend` (onnx falls back to torch when
+    ONNX Runtime is missing).
+    """
+    return _get(backend)[1]
+
+
+def cache_namespace(backend):
+    # Vectors are L2-normalised, so cosine similarity is a plain dot product.
+    # Backends don't produce bit-identical vectors, so each has its own store
+    # (torch keeps the original namespace and directory).
+    if backend == "torch":
+        return f"{MODEL_NAME}:normalized"
+    return f"{MODEL_NAME}:{backend}:normalized"
+
+
+def get_store(backend=None):
+    """
+    The on-disk embedding store of `backend`, or None when it is disabled
+    or can't be opened.
+    """
+    model, backend = _get(backend)
+    if backend not in _stores:
+        dim = model.get_sentence_embedding_dimension()
+        with _lock:
+            if backend not in _stores:
+                store = None
+                if EMBED_CACHE_ENABLED:
+                    dirname = MODEL_NAME if backend == "torch" else f"{MODEL_NAME}-{backend}"
+                    try:
+                        store = EmbeddingStore(
+                            Path(EMBED_CACHE_DIR) / dirname,
+                            namespace=cache_namespace(backend),
+                            dim=dim,
+                            capacity=EMBED_CACHE_SIZE,
+                            max_age=EMBED_CACHE_MAX_AGE,
+                        )
+                    except OSError as e:
+                        print(f"Warning: Embedding cache disabled: {e}")
+                _stores[backend] = store
+    return _stores[backend]
+
+
+def _encode(texts, batch_size, backend=None):
+    vectors = get_model(backend).encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def embed_texts(texts, batch_size=None, use_cache=True, backend=None):
+    """
+    Embeds `texts` into a C-contiguous float32 array of shape
+    (len(texts), dim). Rows are unit length.
+
+    Vectors for texts seen before are read from the on-disk store; only the
+    misses go through the model (`use_cache=False` encodes everything).
+    `backend` overrides THOUGHTNET_EMBED_BACKEND.
+    """
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    dim = get_model(backend).get_sentence_embedding_dimension()
+    if not len(texts):
+        return np.empty((0, dim), dtype=np.float32)
+    store = get_store(backend) if use_cache else None
+    if store is None:
+        return _encode(texts, batch_size, backend)
+
+    digests = [text_digest(t) for t in texts]
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    missing = store.read(digests, out)
+
+    if len(missing):
+        # Encode each distinct missing text once
+        first = {}
+        for i in missing:
+            first.setdefault(digests[i], i)
+        order = list(first.values())
+        encoded = _encode([texts[i] for i in order], batch_size, backend)
+        row_of = {digests[i]: r for r, i in enumerate(order)}
+        out[missing] = encoded[[row_of[digests[i]] for i in missing]]
+        store.put([digests[i] for i in order], encoded)
+
+    return out
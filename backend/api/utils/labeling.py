@@ -1,32 +1,245 @@
-from transformers import pipeline
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
 
-# Initialize the summarization pipeline
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+import numpy as np
+
+# Labeler backends:
+#   "bart"       - abstractive summary with facebook/bart-large-cnn (slow, ~1.6 GB model)
+#   "extractive" - the member sentence closest to the cluster centroid
+#   "keyphrase"  - KeyBERT-style keyphrases scored against the MiniLM embeddings
+LABELERS = ("bart", "extractive", "keyphrase")
+DEFAULT_LABELER = os.getenv("THOUGHTNET_LABELER", "bart")
+
+# How many clusters go through BART in one padded forward pass
+SUMMARY_BATCH_SIZE = int(os.getenv("THOUGHTNET_SUMMARY_BATCH_SIZE", "8"))
+
+# Summaries keyed by the content hash of a cluster's member set
+SUMMARY_CACHE_SIZE = int(os.getenv("THOUGHTNET_SUMMARY_CACHE_SIZE", "2048"))
+_summary_cache = OrderedDict()
+_summary_cache_lock = threading.Lock()
+
+# Loaded on first use so workers running the fast labelers never pay for BART
+summarizer = None
+keyword_model = None
+_model_lock = threading.Lock()
+
+
+def _get_summarizer():
+    global summarizer
+    if summarizer is None:
+        with _model_lock:
+            if summarizer is None:
+                from transformers import pipeline
+
+                # Initialize the summarization pipeline
+                summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+    return summarizer
+
+
+def _get_keyword_model():
+    global keyword_model
+    if keyword_model is None:
+        from api.utils.embeddings import get_model
+
+        # Outside the lock: get_model() takes its own
+        embedder = get_model()
+        with _model_lock:
+            if keyword_model is None:
+                from keybert import KeyBERT
+
+                # Reuse the sentence embedder the pipeline already has in memory
+                keyword_model = KeyBERT(model=embedder)
+    return keyword_model
 
-def generate_summary(texts):
-    """
-    Generate a summary for a cluster based on its texts.
-    """
-    if not texts:
-        return "Misc"
 
+def resolve_labeler(mode=None):
+    mode = (mode or DEFAULT_LABELER).lower()
+    if mode not in LABELERS:
+        raise ValueError(f"Unsupported labeler: {mode}")
+    return mode
+
+
+def _prepare_text(texts):
     # Combine texts into a single string
     combined_text = " ".join(texts)
-    
+
     # Truncate if too long (BART limit is usually 1024 tokens)
     if len(combined_text) > 3000:
         combined_text = combined_text[:3000]
+    return combined_text
+
+
+def _cluster_key(texts, mode):
+    """
+    Order-independent hash of a cluster's member set, so the same cluster
+    coming back from a different sub-query (or request) hits the cache.
+    """
+    h = hashlib.sha1(mode.encode("utf-8"))
+    for t in sorted(set(texts)):
+        h.update(b"\x00")
+        h.update(t.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _cache_get(key):
+    with _summary_cache_lock:
+        if key in _summary_cache:
+            _summary_cache.move_to_end(key)
+            return _summary_cache[key]
+    return None
+
+
+def _cache_put(key, value):
+    with _summary_cache_lock:
+        _summary_cache[key] = value
+        _summary_cache.move_to_end(key)
+        while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+
+
+def _shorten(text, max_chars=120):
+    # First sentence, cut on a word boundary so titles stay readable
+    sentence = re.split(r'(?<=[.!?])\s+', text.strip(), maxsplit=1)[0]
+    if len(sentence) <= max_chars:
+        return sentence
+    return sentence[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+def _centroid(embeddings):
+    emb = np.ascontiguousarray(embeddings, dtype=np.float32)
+    centroid = emb.mean(axis=0)
+    norm = np.linalg.norm(centroid)
+    return emb, (centroid / norm if norm else centroid)
+
+
+def _extractive_labels(text_groups, embedding_groups):
+    if embedding_groups is None:
+        from api.utils.embeddings import embed_texts
+        embedding_groups = [embed_texts(texts) for texts in text_groups]
+
+    labels = []
+    for texts, embeddings in zip(text_groups, embedding_groups):
+        # Rows are unit length, so this is the cosine to the centroid
+        emb, centroid = _centroid(embeddings)
+        scores = emb @ centroid
+        labels.append(_shorten(texts[int(np.argmax(scores))]))
+    return labels
+
+
+def _keyphrase_labels(text_groups, embedding_groups, top_n=2):
+    kw_model = _get_keyword_model()
+    labels = []
+    for i, texts in enumerate(text_groups):
+        kwargs = {}
+        if embedding_groups is not None:
+            # The cluster centroid stands in for the document embedding
+            kwargs["doc_embeddings"] = _centroid(embedding_groups[i])[1].reshape(1, -1)
+        keywords = kw_model.extract_keywords(
+            _prepare_text(texts),
+            keyphrase_ngram_range=(1, 3),
+            stop_words="english",
+            top_n=top_n,
+            use_mmr=True,
+            diversity=0.5,
+            **kwargs,
+        )
+        phrases = [kw for kw, _ in keywords]
+        labels.append(", ".join(p.capitalize() for p in phrases) if phrases else _shorten(texts[0]))
+    return labels
+
+
+def _bart_labels(text_groups):
+    outputs = _get_summarizer()(
+        [_prepare_text(texts) for texts in text_groups],
+        max_length=50,
+        min_length=10,
+        do_sample=False,
+        truncation=True,
+        batch_size=SUMMARY_BATCH_SIZE,
+    )
+    return [out['summary_text'] for out in outputs]
+
+
+def generate_summaries(text_groups, mode=None, embedding_groups=None, top_n=2):
+    """
+    Generate one label per cluster for a whole batch of clusters.
+
+    Clusters already seen (same member set and labeler) are served from the
+    LRU cache; the rest go through the selected labeler together, e.g. in
+    padded BART batches instead of one generation call per cluster.
+    `embedding_groups`, if given, holds the member embeddings of each
+    cluster so the fast labelers don't have to re-encode anything.
+    """
+    mode = resolve_labeler(mode)
+    summaries = [None] * len(text_groups)
+    pending = {}  # cache key -> [positions]
+
+    for i, texts in enumerate(text_groups):
+        if not texts:
+            summaries[i] = "Misc"
+            continue
+
+        key = _cluster_key(texts, mode if mode != "keyphrase" else f"{mode}:{top_n}")
+        cached = _cache_get(key)
+        if cached is not None:
+            summaries[i] = cached
+            continue
+
+        # Identical clusters inside the same batch are only labelled once
+        pending.setdefault(key, []).append(i)
+
+    if not pending:
+        return summaries
+
+    keys = list(pending.keys())
+    groups = [text_groups[pending[k][0]] for k in keys]
+    emb_groups = None
+    if embedding_groups is not None:
+        emb_groups = [embedding_groups[pending[k][0]] for k in keys]
 
     try:
-        summary = summarizer(combined_text, max_length=50, min_length=10, do_sample=False)
-        return summary[0]['summary_text']
+        labels = _run_labeler(mode, groups, emb_groups, top_n)
     except Exception as e:
-        print(f"Summarization failed: {e}")
-        return "Cluster Summary"
+        # One bad cluster shouldn't cost the whole batch its labels
+        print(f"Summarization failed: {e}. Retrying cluster by cluster.")
+        labels = []
+        for n, texts in enumerate(groups):
+            try:
+                labels.append(_run_labeler(mode, [texts], None if emb_groups is None else [emb_groups[n]], top_n)[0])
+            except Exception as e:
+                print(f"Summarization failed: {e}")
+                labels.append(None)
+
+    for key, text in zip(keys, labels):
+        if text is not None:
+            _cache_put(key, text)
+        for i in pending[key]:
+            # Distinct fallbacks: callers key clusters by label
+            summaries[i] = text if text is not None else f"Cluster Summary {i + 1}"
+
+    return summaries
+
+
+def _run_labeler(mode, groups, emb_groups, top_n):
+    if mode == "extractive":
+        return _extractive_labels(groups, emb_groups)
+    if mode == "keyphrase":
+        return _keyphrase_labels(groups, emb_groups, top_n=top_n)
+    return _bart_labels(groups)
+
+
+def generate_summary(texts, mode=None):
+    """
+    Generate a summary for a cluster based on its texts.
+    """
+    return generate_summaries([texts], mode=mode)[0]
 
-def label_cluster(texts, top_n=2):
+def label_cluster(texts, top_n=2, mode=None):
     """
-    Legacy function wrapper for backward compatibility if needed, 
+    Legacy function wrapper for backward compatibility if needed,
     or we can just use generate_summary.
     """
-    return generate_summary(texts)
+    return generate_summaries([texts], mode=mode, top_n=top_n)[0]
@@ -0,0 +1,115 @@
+"""
+Near-duplicate detection with MinHash + LSH banding.
+
+Syndicated headlines and cross-posts differ by punctuation, casing or a
+" - Source" suffix; exact-string dedupe keeps all of them and each one is
+embedded, clustered and summarised. Items are compared on their headline
+(see headline(): outlets attach their own descriptions, which would keep
+two copies of one story far apart). Texts are reduced to word
+shingles, MinHash signatures are bucketed by band so only likely pairs are
+compared, and candidate pairs whose estimated Jaccard similarity reaches
+the threshold are merged (transitively).
+"""
+import os
+import re
+import zlib
+
+import numpy as np
+
+# Estimated Jaccard similarity of word shingles from which two texts count as one
+NEAR_DUP_THRESHOLD = float(os.getenv("THOUGHTNET_NEAR_DUP_THRESHOLD", "0.7"))
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16 # 16 bands x 4 rows: pairs around Jaccard 0.5 and up become candidates
+_PRIME = np.uint64(4294967311) # smallest prime above 2^32
+
+# Trailing outlet name: "... - Reuters", "... | The Verge", "... — BBC News"
+_OUTLET_SUFFIX_RE = re.compile(r"\s+[-|\u2013\u2014]\s+[^-|\u2013\u2014]{1,40}$")
+
+_rng = np.random.default_rng(42)
+# Coefficients below 2^31 keep a * x + b inside uint64 for 32-bit x
+_A = _rng.integers(1, 2**31, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2**31, size=NUM_PERM, dtype=np.uint64)
+
+
+def headline(item):
+    """
+    What an item is compared on: the title the scraper recorded in "meta"
+    (NewsAPI and DDG content is "title. description" / "title: body", and
+    each outlet writes its own description), without a trailing outlet
+    name. Items without a title (HN, whose content is the title) fall back
+    to their content.
+    """
+    title = (item.get("meta") or {}).get("title") or item["content"]
+    return _OUTLET_SUFFIX_RE.sub("", title.strip())
+
+
+def shingles(text):
+    """
+    Hashed word shingles of the lowercased, punctuation-free text (empty
+    for a text without any words).
+    """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return np.fromiter({zlib.crc32(g.encode("utf-8")) for g in grams}, dtype=np.uint64)
+
+
+def minhash(text):
+    """
+    MinHash signature of the text, or None if it has no shingles.
+    """
+    x = shingles(text)[:, None]
+    if not len(x):
+        return None
+    # (shingles x perms) -> min per permutation
+    return ((_A * x + _B) % _PRIME).min(axis=0)
+
+
+def near_duplicate_groups(texts, threshold=None):
+    """
+    Groups of indices into `texts` that are near-duplicates of each other,
+    in order of first appearance; every text is in exactly one group and a
+    group's first index is its earliest text. Texts without words (emoji,
+    punctuation) have nothing to compare and stay on their own.
+    """
+    threshold = NEAR_DUP_THRESHOLD if threshold is None else threshold
+    n = len(texts)
+    if n < 2:
+        return [[i] for i in range(n)]
+
+    signatures = [minhash(t) for t in texts]
+    comparable = [i for i, sig in enumerate(signatures) if sig is not None]
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = NUM_PERM // BANDS
+    checked = set()
+    for band in range(BANDS):
+        buckets = {}
+        for i in comparable:
+            buckets.setdefault(bytes(signatures[i][band * rows:(band + 1) * rows]), []).append(i)
+        for members in buckets.values():
+            for pos, j in enumerate(members[1:], 1):
+                for i in members[:pos]:
+                    a, b = find(i), find(j)
+                    if a == b or (i, j) in checked:
+                        continue
+                    checked.add((i, j))
+                    # Share of equal MinHash values estimates the Jaccard similarity
+                    if np.mean(signatures[i] == signatures[j]) >= threshold:
+                        # Keep the earlier index as the root
+                        parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
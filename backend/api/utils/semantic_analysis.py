@@ -1,26 +1,54 @@
-
+import os
 import re
+import threading
+from functools import lru_cache
 
-try:
-    import spacy
-    try:
-        nlp = spacy.load("en_core_web_sm")
-    except OSError:
-        # Try to download if not present, but if it fails, fallback
-        try:
-            from spacy.cli import download
-            download("en_core_web_sm")
-            nlp = spacy.load("en_core_web_sm")
-        except Exception as e:
-            print(f"Warning: Could not load spacy model: {e}. Using fallback.")
-            nlp = None
-except ImportError:
-    print("Warning: Spacy not installed. Using fallback.")
-    nlp = None
+SPACY_MODEL = "en_core_web_sm"
+
+# The analysis only reads POS tags, dependency arcs and entities (for the
+# complexity score), so the lemmatizer is never loaded
+SPACY_EXCLUDE = ["lemmatizer"]
+
+# Memoised analyses of recent queries
+QUERY_CACHE_SIZE = int(os.getenv("THOUGHTNET_QUERY_CACHE_SIZE", "1024"))
+
+# "Question 1? Question 2?" -> one sentence per ?-run (the ?s included)
+_SENTENCE_RE = re.compile(r'[^?]*\?+|[^?]+')
+# Conjunctions we split clauses on
+_CONJUNCTION_RE = re.compile(r'(?i)(?:,?\s+and\s+|,?\s+or\s+|,?\s+but\s+)')
+
+# Loaded on first use (or by api.utils.warmup). A missing model is never
+# downloaded from here; install it once with
+#   python -m spacy download en_core_web_sm
+_nlp = None
+_nlp_loaded = False
+_nlp_lock = threading.Lock()
+
+
+def get_nlp():
+    """
+    The spaCy pipeline, or None (regex fallback) if spaCy or the model is
+    not installed.
+    """
+    global _nlp, _nlp_loaded
+    if not _nlp_loaded:
+        with _nlp_lock:
+            if not _nlp_loaded:
+                try:
+                    import spacy
+                    _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+                except ImportError:
+                    print("Warning: Spacy not installed. Using fallback.")
+                except OSError as e:
+                    print(f"Warning: Could not load spacy model: {e}. "
+                          f"Run `python -m spacy download {SPACY_MODEL}`. Using fallback.")
+                _nlp_loaded = True
+    return _nlp
 
-def calculate_complexity(query):
+def calculate_complexity(query, doc=None):
     """
     Calculate a complexity score (3-7) for the query.
+    `doc` is the query's spaCy parse if the caller already has one.
     """
     score = 3
     
@@ -32,8 +60,10 @@ def calculate_complexity(query):
         score += 1
         
     # Sub-clause factor (if we can detect them)
-    if nlp:
-        doc = nlp(query)
+    if doc is None:
+        nlp = get_nlp()
+        doc = nlp(query) if nlp else None
+    if doc is not None:
         # Count verbs/clauses
         verbs = [t for t in doc if t.pos_ == "VERB"]
         if len(verbs) > 2:
@@ -46,77 +76,97 @@ def calculate_complexity(query):
             
     return min(score, 7)
 
+
+def _strip_bounds(text, start, end):
+    # (start, end) of text[start:end] with surrounding whitespace trimmed, or None if blank
+    chunk = text[start:end]
+    stripped = chunk.strip()
+    if not stripped:
+        return None
+    start += len(chunk) - len(chunk.lstrip())
+    return start, start + len(stripped)
+
+
+def _clause_bounds(query):
+    """
+    Character bounds of the clauses of `query`, grouped per sentence:
+    sentences end at a run of '?', clauses are split on and/or/but.
+    """
+    sentences = []
+    for sent in _SENTENCE_RE.finditer(query):
+        bounds = _strip_bounds(query, sent.start(), sent.end())
+        if bounds is None:
+            continue
+        s_start, s_end = bounds
+
+        clauses = []
+        pos = s_start
+        for conj in _CONJUNCTION_RE.finditer(query, s_start, s_end):
+            clauses.append((pos, conj.start()))
+            pos = conj.end()
+        clauses.append((pos, s_end))
+        clauses = [b for b in (_strip_bounds(query, a, z) for a, z in clauses) if b]
+        if clauses:
+            sentences.append(clauses)
+    return sentences
+
+
+def _decompose(query, doc):
+    """
+    Splits the query into sub-queries on a single parse: every clause is a
+    token span of `doc`, so subjects and verbs come from the dependency arcs
+    of the whole query instead of re-parsing each fragment.
+    """
+    final_sub_queries = []
+
+    for clauses in _clause_bounds(query):
+        current_subj = None
+        
+        for start, end in clauses:
+            part = query[start:end]
+            span = doc.char_span(start, end, alignment_mode="expand")
+            tokens = list(span) if span is not None else []
+
+            # Detect Subject
+            subjs = [t.text for t in tokens if t.dep_ in ("nsubj", "nsubjpass", "expl")]
+
+            if subjs:
+                current_subj = subjs[0]
+                final_sub_queries.append(part)
+            elif current_subj:
+                # Missing subject: reconstruct context from the previous clause,
+                # whether or not this one has a verb of its own.
+                # E.g. "Is AGI upcoming or false?" -> "AGI false?"
+                final_sub_queries.append(f"{current_subj} {part}")
+            else:
+                # No previous subject. Keep as is.
+                final_sub_queries.append(part)
+
+    return final_sub_queries
+
+
 def analyze_query(query):
     """
     Analyzes the input query and breaks it down into sub-sentences or clauses.
     Returns a list of sub-queries and a complexity score.
+
+    Results are memoised per query string; callers get their own list.
     """
-    complexity = calculate_complexity(query)
-    sub_queries = []
+    sub_queries, complexity = _analyze_query(query)
+    return list(sub_queries), complexity
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _analyze_query(query):
+    nlp = get_nlp()
+    # The only parse of this query
+    doc = nlp(query) if nlp else None
+    complexity = calculate_complexity(query, doc=doc)
     
-    if nlp:
+    if doc is not None:
         try:
-            doc = nlp(query)
-            
-            # 1. Split by '?' first to handle multiple sentence questions.
-            # E.g. "Question 1? Question 2?"
-            # We use regex to split but keep the '?'
-            initial_parts = re.split(r'(\?+)', query)
-            sentences = []
-            current = ""
-            for p in initial_parts:
-                if '?' in p:
-                    current += p
-                    sentences.append(current.strip())
-                    current = ""
-                else:
-                    current += p
-            if current.strip():
-                sentences.append(current.strip())
-            
-            final_sub_queries = []
-            
-            for sent_text in sentences:
-                if not sent_text: continue
-                sent_doc = nlp(sent_text)
-
-                # 2. Textual Split by Conjunctions for robustness
-                # We split by "and", "or", "but"
-                parts = re.split(r'(?i)(?:,?\s+and\s+|,?\s+or\s+|,?\s+but\s+)', sent_text)
-                clean_parts = [p.strip() for p in parts if p.strip()]
-                
-                current_subj = None
-                
-                for i, part in enumerate(clean_parts):
-                    p_doc = nlp(part)
-                    
-                    # Detect Subject
-                    subjs = [t.text for t in p_doc if t.dep_ in ("nsubj", "nsubjpass", "expl")]
-                    has_subj = len(subjs) > 0
-                    
-                    # Detect Verb/Aux (to confirm it's a clause)
-                    has_verb = any(t.pos_ in ("VERB", "AUX") for t in p_doc)
-
-                    if has_subj:
-                        current_subj = subjs[0] 
-                        final_sub_queries.append(part)
-                    else:
-                        # Missing subject.
-                        if current_subj:
-                             # Reconstruct context
-                             # If we have a verb but no subject, prepend subject.
-                             if has_verb:
-                                 final_sub_queries.append(f"{current_subj} {part}")
-                             else:
-                                 # No verb either? E.g. "Is AGI upcoming or false?" -> "false"
-                                 # Prepend subject
-                                 final_sub_queries.append(f"{current_subj} {part}")
-                        else:
-                             # No previous subject. Keep as is.
-                             final_sub_queries.append(part)
-
-            sub_queries = final_sub_queries if final_sub_queries else [query]
-            return sub_queries, complexity
+            sub_queries = _decompose(query, doc)
+            return tuple(sub_queries or [query]), complexity
             
         except Exception as e:
             print(f"Error in spacy analysis: {e}. Falling back to regex.")
@@ -126,4 +176,7 @@ def analyze_query(query):
     parts = [p.strip() for p in parts if p.strip()]
     
     sub_queries = parts if parts else [query]
-    return sub_queries, complexity
+    return tuple(sub_queries), complexity
+
+
+analyze_query.cache_clear = _analyze_query.cache_clear
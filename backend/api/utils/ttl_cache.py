@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache whose entries remember when they were stored.
+
+    `get` returns `(value, age_seconds)` or None; entries older than
+    `max_age` are dropped. Callers decide what "fresh" and "stale" mean
+    (the scraper cache serves stale entries while it refreshes them).
+    """
+
+    def __init__(self, maxsize=1024, max_age=None):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            age = now - stored_at
+            if self.max_age is not None and age > self.max_age:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value, age
+
+    def set(self, key, value, stored_at=None):
+        with self._lock:
+            self._data[key] = (value, stored_at if stored_at is not None else time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,86 @@
+"""
+Explicit model warmup.
+
+Nothing heavy is loaded at import any more (see get_model / get_nlp /
+_get_summarizer); the first request would pay for it instead. warmup()
+loads everything up front, start_warmup() does it on a background thread
+so the /api/warmup/ ping returns straight away.
+"""
+import threading
+from concurrent.futures import wait
+
+from api.metrics import span
+
+_state = "idle" # idle | running | done | failed
+_state_lock = threading.Lock()
+
+
+def load_models(labeler=None):
+    """
+    Loads the models the CPU stages need in this process: the sentence
+    embedder (and its on-disk cache) plus whatever the labeler uses.
+    """
+    from api.utils import embeddings
+    from api.utils.labeling import _get_keyword_model, _get_summarizer, resolve_labeler
+
+    with span("warmup", model="embedder"):
+        embeddings.get_store()
+
+    mode = resolve_labeler(labeler)
+    if mode == "bart":
+        with span("warmup", model="bart"):
+            _get_summarizer()
+    elif mode == "keyphrase":
+        with span("warmup", model="keybert"):
+            _get_keyword_model()
+
+
+def warmup(labeler=None):
+    """
+    spaCy is used on the event loop, so it's loaded here; the other models
+    are loaded wherever the CPU stages run (this process in thread mode,
+    each worker process in process mode).
+    """
+    from api.utils.semantic_analysis import get_nlp
+    from api import workers
+
+    with span("warmup", model="spacy"):
+        get_nlp()
+
+    if workers.WORKER_MODE == "process":
+        # One job per worker spawns them all (their initializer loads the
+        # embedder) and loads the labeler's model in each
+        executor = workers.get_executor()
+        wait([executor.submit(load_models, labeler) for _ in range(workers.WORKER_COUNT)])
+    else:
+        load_models(labeler)
+
+
+def _run(labeler):
+    global _state
+    try:
+        warmup(labeler)
+        _state = "done"
+    except Exception as e:
+        print(f"[Warmup] Failed: {e}")
+        _state = "failed"
+
+
+def start_warmup(labeler=None):
+    """
+    Starts warmup() on a daemon thread unless it is running or already
+    done. Returns the current state.
+    """
+    global _state
+    with _state_lock:
+        if _state in ("idle", "failed"):
+            _state = "running"
+            threading.Thread(target=_run, args=(labeler,), daemon=True, name="thoughtnet-warmup").start()
+        return _state
+
+
+def warmup_state():
+    """
+    idle | running | done | failed, as reported by the /api/warmup/ ping.
+    """
+    return _state
@@ -1,31 +1,158 @@
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotFound, JsonResponse, StreamingHttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 # from api.pipeline import run_pipeline # Old sync pipeline
-from api.async_pipeline import run_async_pipeline
-from asgiref.sync import async_to_sync
+from api import metrics
+from api.async_pipeline import run_async_pipeline, stream_async_pipeline
+from api.graph_builder import compact_graph
+from api.response_cache import get_or_compute, response_key
+from api.processing import resolve_cluster_scope
+from api.scrapers.clients import aclose_clients
+from api.utils.labeling import resolve_labeler
+from api.utils.warmup import start_warmup, warmup_state
+
+
+def _on_throwaway_loop(request):
+    # Under a WSGI server (runserver) every async view call runs on its own
+    # event loop that is discarded afterwards; the scraper clients opened on
+    # it have to be closed before it goes. Under ASGI they live on.
+    return not isinstance(request, ASGIRequest)
+
+
+def _is_complete(result):
+    # Graphs missing sources that merely timed out shouldn't be pinned in the cache
+    return not any(d["reason"] != "error" for d in result.get("dropped_sources", []))
+
 
-from rest_framework.decorators import api_view
+# No whitespace in JSON bodies
+COMPACT_JSON = {"separators": (",", ":")}
 
-@api_view(['GET'])
-def thoughtnet_pipeline_view(request):
+
+@gzip_page
+@require_GET
+async def thoughtnet_pipeline_view(request):
     """
-    Sync Wrapper for ThoughtNet Async Pipeline.
-    Uses async_to_sync to bridge DRF (Sync) and Pipeline (Async).
+    Async view for the ThoughtNet Async Pipeline.
+    Plain Django (DRF views are sync-only), so under ASGI the pipeline is
+    awaited on the server's event loop instead of tying up a thread per request.
     """
-    query = request.query_params.get("query", "AI")
-    sources = request.query_params.getlist("sources") or ["reddit", "news", "hn"]
+    query = request.GET.get("query", "AI")
+    sources = request.GET.getlist("sources") or ["reddit", "news", "hn"]
+
+    # Cluster labeler: "bart" (abstractive), "extractive" or "keyphrase" (fast)
+    # Cluster scope: "sub_query" (clusters per sub-topic) or "global" (shared clusters)
+    try:
+        labeler = resolve_labeler(request.GET.get("labeler"))
+        cluster_scope = resolve_cluster_scope(request.GET.get("cluster_scope"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # ?timings=1 adds this run's per-stage timings; such requests skip the
+    # response cache, a cached graph would report someone else's run
+    timings = request.GET.get("timings") in ("1", "true")
+    # ?compact=1 sends nodes/edges/evidence as rows (see compact_graph); the
+    # cache keeps the regular form, so it's applied per response
+    compact = request.GET.get("compact") in ("1", "true")
 
     try:
-        # Wrap async call
-        result = async_to_sync(run_async_pipeline)(query=query, sources=sources)
-        return Response(result, status=status.HTTP_200_OK)
+        if timings:
+            result = await run_async_pipeline(query=query, sources=sources, labeler=labeler, timings=True,
+                                              cluster_scope=cluster_scope)
+        else:
+            # Served from the response cache; identical concurrent queries share one run
+            result = await get_or_compute(
+                response_key(query, sources, labeler=labeler, cluster_scope=cluster_scope),
+                lambda: run_async_pipeline(query=query, sources=sources, labeler=labeler,
+                                           cluster_scope=cluster_scope),
+                cacheable=_is_complete,
+            )
+        if compact:
+            result = compact_graph(result)
+        return JsonResponse(result, status=status.HTTP_200_OK, json_dumps_params=COMPACT_JSON)
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    finally:
+        if _on_throwaway_loop(request):
+            await aclose_clients()
+
+
+@require_GET
+async def thoughtnet_stream_view(request):
+    """
+    Streaming variant of /api/cluster/: the root and sub-query nodes go out
+    immediately, then each sub-query's clusters and evidence as soon as they
+    are ready. NDJSON by default; Server-Sent Events with ?format=sse or
+    `Accept: text/event-stream`.
+    """
+    query = request.GET.get("query", "AI")
+    sources = request.GET.getlist("sources") or ["reddit", "news", "hn"]
+
+    try:
+        labeler = resolve_labeler(request.GET.get("labeler"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    use_sse = (request.GET.get("format") == "sse"
+               or "text/event-stream" in request.headers.get("Accept", ""))
+
+    async def events():
+        try:
+            async for event in stream_async_pipeline(query=query, sources=sources, labeler=labeler):
+                payload = json.dumps(event, **COMPACT_JSON)
+                if use_sse:
+                    yield f"event: {event['event']}\ndata: {payload}\n\n"
+                else:
+                    yield payload + "\n"
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            payload = json.dumps({"event": "error", "error": str(e)})
+            yield f"event: error\ndata: {payload}\n\n" if use_sse else payload + "\n"
+        finally:
+            # Under WSGI the stream is consumed on a loop of its own as well
+            if _on_throwaway_loop(request):
+                await aclose_clients()
+
+    response = StreamingHttpResponse(
+        events(),
+        content_type="text/event-stream" if use_sse else "application/x-ndjson",
+    )
+    # Don't let proxies buffer the stream
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Stage timing histograms in the Prometheus text format, for a local
+    scraper (set THOUGHTNET_METRICS_PUBLIC=True to expose it beyond loopback).
+    """
+    if not metrics.METRICS_PUBLIC and request.META.get("REMOTE_ADDR") not in ("127.0.0.1", "::1"):
+        return HttpResponseNotFound()
+    return HttpResponse(metrics.render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 class WarmupPing(APIView):
     def get(self, request):
-        return Response({"status": "awake"}, status=200)
+        # Load the models in the background so the first real query doesn't
+        # pay for them; the ping itself answers right away. "warmup" is
+        # idle / running / done / failed, so clients can poll until "done";
+        # ?start=0 only reports it (health checks)
+        if request.GET.get("start") in ("0", "false"):
+            return Response({"status": "awake", "warmup": warmup_state()}, status=200)
+        try:
+            labeler = resolve_labeler(request.GET.get("labeler"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        start_warmup(labeler)
+        return Response({"status": "awake", "warmup": warmup_state()}, status=200)
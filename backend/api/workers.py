@@ -0,0 +1,92 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from api import metrics
+
+# Where the CPU-bound stages (embed / cluster / label) run:
+#   "thread"  - threads in this process; models are shared, torch releases the GIL
+#   "process" - separate worker processes, each with its own copy of the models
+WORKER_MODE = os.getenv("THOUGHTNET_WORKER_MODE", "thread")
+WORKER_COUNT = int(os.getenv("THOUGHTNET_WORKERS", "2"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    """
+    Runs once in every worker process: loads the embedder, which every
+    labeler needs. Labeler models stay lazy (or come from api.utils.warmup),
+    so a request for a fast labeler never waits for BART.
+
+    Thread workers share this process's models and have no initializer:
+    they only start on the first submitted job, so a preload there would
+    run inside the first request.
+    """
+    # Best-effort: an exception here would mark the whole pool broken, while
+    # the model loads lazily anyway, so a failed preload only costs latency
+    try:
+        from api.utils.embeddings import get_store
+
+        get_store()
+    except Exception as e:
+        print(f"[Workers] Model preload failed: {e!r}. Loading lazily instead.")
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if WORKER_MODE == "process":
+                    # spawn, not fork: forking a process that already holds
+                    # torch threads can deadlock the children
+                    _executor = ProcessPoolExecutor(
+                        max_workers=WORKER_COUNT,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                    )
+                elif WORKER_MODE == "thread":
+                    _executor = ThreadPoolExecutor(
+                        max_workers=WORKER_COUNT,
+                        thread_name_prefix="thoughtnet-cpu",
+                    )
+                else:
+                    raise ValueError(f"Unsupported worker mode: {WORKER_MODE}")
+    return _executor
+
+
+def _call_with_spans(func, args, kwargs):
+    # Spans finished in the worker travel back with the result: a worker
+    # process has its own (never scraped) histograms, and a worker thread
+    # doesn't see the request's timing context
+    with metrics.collect_timings(defer=True) as spans:
+        result = func(*args, **kwargs)
+    return result, spans
+
+
+async def run_cpu(func, *args, **kwargs):
+    """
+    Await `func(*args, **kwargs)` on the worker pool, keeping the event
+    loop free for other requests. In process mode `func` and its arguments
+    must be picklable (module-level function, plain data).
+    """
+    loop = asyncio.get_running_loop()
+    result, spans = await loop.run_in_executor(
+        get_executor(), functools.partial(_call_with_spans, func, args, kwargs)
+    )
+    for record in spans:
+        metrics.record_span(record)
+    return result
+
+
+def shutdown_executor(wait=True):
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
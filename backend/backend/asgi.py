@@ -3,6 +3,10 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+/api/cluster/ is an async view, so serve the project through this module
+(e.g. ``uvicorn backend.asgi:application``) to multiplex concurrent queries
+on one event loop per worker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +17,27 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """
+    Django doesn't speak the ASGI lifespan protocol; handle it here so the
+    scraper clients of this worker's loop and the CPU pool are closed on
+    shutdown instead of leaking.
+    """
+    if scope["type"] != "lifespan":
+        return await django_application(scope, receive, send)
+
+    from api.scrapers.clients import aclose_clients
+    from api.workers import shutdown_executor
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aclose_clients()
+            shutdown_executor(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
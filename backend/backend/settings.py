@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
 from dotenv import load_dotenv
 
@@ -112,6 +113,37 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Scraper responses are always cached in-process (api/scrapers/cache.py).
+# Set REDIS_URL to share them between workers as well; that needs the
+# optional redis client (pip install "redis>=4.5").
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL and importlib.util.find_spec("redis") is None:
+    # Otherwise every shared-cache read would fail and fall through
+    print("Warning: REDIS_URL is set but the redis package is not installed. "
+          "Scraper cache stays in-process.")
+    REDIS_URL = None
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
+
+if REDIS_URL:
+    CACHES["thoughtnet"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+
+# Cache alias used as the shared scraper cache (None = in-process only)
+THOUGHTNET_SCRAPER_CACHE = "thoughtnet" if REDIS_URL else None
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -314,9 +314,15 @@ const ClusterGraph = () => {
       const res = await axios.get(`http://127.0.0.1:8000/api/cluster/?query=${encodeURIComponent(query)}`);
       // The new API returns { root_id: "...", nodes: [...], edges: [...] }
       const data = res.data || {};
+      // Evidence nodes point into data.evidence ({ text, url, source }) by index
+      const evidence = data.evidence || [];
       
       const nodes = (data.nodes || []).map(n => ({
         ...n,
+        ...(n.evidence !== undefined ? {
+          url: evidence[n.evidence]?.url,
+          source: evidence[n.evidence]?.source
+        } : {}),
         // Assign default colors based on type if not present
         color: n.color || (
            n.type === 'root' ? '#ff4b4b' :
@@ -331,7 +337,7 @@ const ClusterGraph = () => {
            n.type === 'thought_cloud' ? 15 :
            5
         ),
-        fullText: n.full_text || n.fullText || ""
+        fullText: (n.evidence !== undefined ? evidence[n.evidence]?.text : n.full_text) || ""
       }));
 
       const links = (data.edges || []).map(e => ({